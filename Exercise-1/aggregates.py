@@ -0,0 +1,256 @@
+import os
+import json
+import shutil
+import argparse
+from functools import partial
+from collections import Counter
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import trips
+
+# Trip aggregates kept per quarter, so reports never rescan raw rows.
+# Each quarter (a Parquet partition from the cache, or an extracted CSV) is read
+# once in record batches and reduced to three mergeable pieces:
+#   - trips per start station per day (a small Parquet table),
+#   - a log-binned trip duration histogram (percentiles to within ~1.2%),
+#   - trips per user type.
+# They are stored under <agg_dir>/year=YYYY/quarter=Q/ next to a running total in
+# <agg_dir>/_totals/. update_aggregates() only reads quarters that are new or whose
+# source changed, then adds them to the totals; rollup() merges any range of stored
+# quarters without touching trip rows.
+#
+#   update_aggregates('parquet', 'aggregates')
+#   totals = load_totals('aggregates')
+#   totals.duration_percentiles([50, 90, 99])
+#   rollup('aggregates', years=[2019], quarters=[3, 4]).station_day
+
+AGG_COLUMNS = ['start_time', 'duration_sec', 'from_station_id', 'user_type']
+STATION_DAY_SCHEMA = pa.schema([
+    ('from_station_id', pa.int64()),
+    ('day', pa.date32()),
+    ('trips', pa.int64()),
+])
+# Duration bin i covers [10**(i / BINS_PER_DECADE), 10**((i + 1) / BINS_PER_DECADE))
+# seconds; anything under a second lands in bin 0
+BINS_PER_DECADE = 100
+STATION_DAY_NAME = 'station_day.parquet'
+SUMMARY_NAME = 'summary.json'
+TOTALS_DIR = '_totals'
+
+
+class TripAggregate:
+    # Everything in here is a count, so merging is addition and the result of
+    # merging quarters is the same as aggregating their rows together
+    def __init__(self, station_day=None, duration_bins=None, user_types=None, rows=0, sources=None):
+        self.station_day = station_day if station_day is not None else STATION_DAY_SCHEMA.empty_table()
+        self.duration_bins = Counter(duration_bins or {})
+        self.user_types = Counter(user_types or {})
+        self.rows = rows
+        # quarter key ("2019_Q3") -> source signature, see source_signature()
+        self.sources = dict(sources or {})
+
+    def merge(self, *others):
+        merged = TripAggregate(duration_bins=self.duration_bins, user_types=self.user_types,
+                               rows=self.rows, sources=self.sources)
+        tables = [self.station_day]
+        for other in others:
+            tables.append(other.station_day)
+            merged.duration_bins.update(other.duration_bins)
+            merged.user_types.update(other.user_types)
+            merged.rows += other.rows
+            merged.sources.update(other.sources)
+        merged.station_day = sum_station_days(tables)
+        return merged
+
+    def duration_percentiles(self, pcts):
+        # {pct: seconds}, each the geometric middle of the bin the percentile falls in
+        total = sum(self.duration_bins.values())
+        result = {pct: None for pct in pcts}
+        if not total:
+            return result
+        ordered = sorted(self.duration_bins.items())
+        for pct in pcts:
+            target, seen = pct / 100 * total, 0
+            for index, count in ordered:
+                seen += count
+                if seen >= target:
+                    result[pct] = 10 ** ((index + 0.5) / BINS_PER_DECADE)
+                    break
+        return result
+
+    def trips_per_day(self):
+        return (self.station_day.group_by('day').aggregate([('trips', 'sum')])
+                .rename_columns(['day', 'trips']).sort_by('day'))
+
+    def save(self, out_dir):
+        # Through a temp directory so a crash never leaves a half-written aggregate
+        tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        pq.write_table(self.station_day, os.path.join(tmp_dir, STATION_DAY_NAME), compression='zstd')
+        with open(os.path.join(tmp_dir, SUMMARY_NAME), 'w') as f:
+            json.dump({'rows': self.rows, 'sources': self.sources,
+                       'duration_bins': {str(index): count for index, count in sorted(self.duration_bins.items())},
+                       'user_types': dict(self.user_types)}, f, indent=2, sort_keys=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+
+    @classmethod
+    def load(cls, in_dir):
+        with open(os.path.join(in_dir, SUMMARY_NAME)) as f:
+            summary = json.load(f)
+        return cls(station_day=pq.read_table(os.path.join(in_dir, STATION_DAY_NAME)),
+                   duration_bins={int(index): count for index, count in summary['duration_bins'].items()},
+                   user_types=summary['user_types'], rows=summary['rows'], sources=summary['sources'])
+
+
+def sum_station_days(tables):
+    tables = [table for table in tables if table.num_rows]
+    if not tables:
+        return STATION_DAY_SCHEMA.empty_table()
+    combined = pa.concat_tables(tables)
+    if len(tables) == 1:
+        return combined
+    summed = combined.group_by(['from_station_id', 'day']).aggregate([('trips', 'sum')])
+    return summed.select(['from_station_id', 'day', 'trips_sum']).rename_columns(STATION_DAY_SCHEMA.names)
+
+
+#--------- Aggregating Rows ------------
+def aggregate_batch(batch):
+    # One record batch (TRIP_SCHEMA columns) reduced with vectorised kernels
+    station_day = pa.table({
+        'from_station_id': batch.column('from_station_id'),
+        'day': pc.cast(batch.column('start_time'), pa.date32()),
+    }).group_by(['from_station_id', 'day']).aggregate([([], 'count_all')])
+    station_day = station_day.select(['from_station_id', 'day', 'count_all']).rename_columns(STATION_DAY_SCHEMA.names)
+
+    durations = pc.drop_null(batch.column('duration_sec'))
+    durations = pc.filter(durations, pc.is_finite(durations))
+    bins = pc.cast(pc.floor(pc.multiply(pc.log10(pc.max_element_wise(durations, 1.0)), BINS_PER_DECADE)), pa.int64())
+    duration_bins = value_counts(bins)
+
+    user_types = pc.fill_null(batch.column('user_type'), 'Unknown')
+    return TripAggregate(station_day, duration_bins, value_counts(user_types), rows=batch.num_rows)
+
+
+def value_counts(array):
+    counts = pc.value_counts(array)
+    return dict(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()))
+
+
+def read_source(path):
+    # Record batches of just the aggregated columns, from a Parquet file or a CSV
+    if path.endswith('.parquet'):
+        return pq.ParquetFile(path).iter_batches(columns=AGG_COLUMNS)
+    return trips.read_batches(partial(open, path, 'rb'))
+
+
+def quarter_key(path):
+    year, quarter = trips.quarter_of(os.path.basename(path))
+    return f"{year}_Q{quarter}"
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def aggregate_quarter(path):
+    # Station-day groups from each batch are only summed once at the end; they are
+    # a few thousand rows per batch however large the quarter is
+    parts = [aggregate_batch(batch) for batch in read_source(path)]
+    aggregate = TripAggregate(sources={quarter_key(path): source_signature(path)})
+    return aggregate.merge(*parts)
+
+
+#--------- Stored Aggregates ------------
+def quarter_dir(agg_dir, key):
+    year, quarter = trips.quarter_of(key)
+    return os.path.join(agg_dir, f"year={year}", f"quarter={quarter}")
+
+
+def find_sources(source_dir):
+    # Parquet cache partitions and/or extracted CSVs, keyed by quarter; Parquet wins
+    sources = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [name for name in dirs if not name.startswith(('_', '.'))]
+        for name in sorted(files):
+            if name.startswith(('_', '.')) or not name.endswith(('.parquet', '.csv')):
+                continue
+            try:
+                key = quarter_key(name)
+            except ValueError:
+                continue
+            if name.endswith('.parquet') or key not in sources:
+                sources[key] = os.path.join(root, name)
+    return sources
+
+
+def stored_quarters(agg_dir):
+    keys = []
+    for root, dirs, files in os.walk(agg_dir):
+        dirs[:] = [name for name in dirs if not name.startswith(('_', '.')) and not name.endswith('.tmp')]
+        if SUMMARY_NAME in files:
+            year, quarter = (part.split('=')[1] for part in os.path.relpath(root, agg_dir).split(os.sep))
+            keys.append(f"{year}_Q{quarter}")
+    return sorted(keys)
+
+
+def load_totals(agg_dir):
+    try:
+        return TripAggregate.load(os.path.join(agg_dir, TOTALS_DIR))
+    except FileNotFoundError:
+        return TripAggregate()
+
+
+def update_aggregates(source_dir, agg_dir):
+    # Aggregates every quarter in source_dir that is new or changed since it was last
+    # aggregated and folds it into the totals. Returns the quarter keys it read.
+    # A changed quarter can't be subtracted from the totals, so the totals are then
+    # re-merged from the stored quarters, which is still no raw rows.
+    totals = load_totals(agg_dir)
+    updated, changed = [], False
+    for key, path in sorted(find_sources(source_dir).items()):
+        stored = totals.sources.get(key)
+        if stored == source_signature(path):
+            continue
+        aggregate_quarter(path).save(quarter_dir(agg_dir, key))
+        updated.append(key)
+        changed = changed or stored is not None
+    if not updated:
+        return updated
+    if changed:
+        totals = rollup(agg_dir)
+    else:
+        totals = totals.merge(*(TripAggregate.load(quarter_dir(agg_dir, key)) for key in updated))
+    totals.save(os.path.join(agg_dir, TOTALS_DIR))
+    return updated
+
+
+def rollup(agg_dir, years=None, quarters=None):
+    # Merges the stored quarters matching years/quarters (None means all)
+    parts = []
+    for key in stored_quarters(agg_dir):
+        year, quarter = trips.quarter_of(key)
+        if (years is None or year in years) and (quarters is None or quarter in quarters):
+            parts.append(TripAggregate.load(quarter_dir(agg_dir, key)))
+    return TripAggregate().merge(*parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update per-quarter Divvy trip aggregates.")
+    parser.add_argument('source_dir', help="Parquet cache (PARQUET_DIR) or directory of extracted CSVs")
+    parser.add_argument('agg_dir', nargs='?', default='aggregates')
+    args = parser.parse_args()
+    updated = update_aggregates(args.source_dir, args.agg_dir)
+    totals = load_totals(args.agg_dir)
+    print(json.dumps({
+        'updated': updated, 'quarters': sorted(totals.sources), 'rows': totals.rows,
+        'station_days': totals.station_day.num_rows, 'user_types': dict(totals.user_types),
+        'duration_s': {f"p{pct}": value for pct, value in totals.duration_percentiles([50, 90, 99]).items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
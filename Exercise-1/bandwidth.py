@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+# Shared bandwidth cap for every in-flight transfer in main.py.
+# A token bucket that hands out reservations instead of blocking: a transfer that has
+# just read n bytes reserves n tokens and is told how long to sleep before reading
+# more. Tokens may go negative, so a reservation queues behind all earlier ones. That
+# makes the bucket FIFO, and since every stream pays per chunk, concurrent files get
+# turns in the order they asked, which is an even share. Because it only returns a
+# delay, threads sleep and coroutines await asyncio.sleep() on the same bucket, and
+# nothing ever blocks the event loop.
+#
+#   limiter = BandwidthLimiter(rate=20 * MB, per_host_rate=8 * MB)
+#   time.sleep(limiter.reserve(uri, len(chunk)))
+#   limiter.set_rate(rate=5 * MB)          # takes effect on the next reservation
+
+MB = 1024 * 1024
+# Burst allowance, in seconds of the rate; small so the cap holds over short windows
+BURST_S = 0.1
+# Throttled streams read at most this much per chunk, so turns stay short and even
+LIMITED_CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    # rate is bytes per second; None means unlimited
+    def __init__(self, rate=None, burst_s=BURST_S):
+        self.lock = threading.Lock()
+        self.burst_s = burst_s
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.rate * self.burst_s, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate):
+        # Tokens accrued so far are kept (an existing backlog still has to be paid for),
+        # and only the refill speed changes from now on
+        with self.lock:
+            self._refill(time.monotonic())
+            if rate and not self.rate:
+                self.tokens = rate * self.burst_s
+            self.rate = rate or None
+
+    def reserve(self, nbytes):
+        # Seconds to wait before these bytes are within the rate
+        with self.lock:
+            if not self.rate:
+                return 0.0
+            self._refill(time.monotonic())
+            self.tokens -= nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BandwidthLimiter:
+    # A global bucket plus one bucket per host, all optional. A chunk is charged to
+    # both and waits for whichever is further behind.
+    def __init__(self, rate=None, per_host_rate=None, burst_s=BURST_S):
+        self.lock = threading.Lock()
+        self.burst_s = burst_s
+        self.global_bucket = TokenBucket(rate, burst_s)
+        self.per_host_rate = per_host_rate
+        self.host_buckets = {}
+
+    @property
+    def active(self):
+        return bool(self.global_bucket.rate or self.per_host_rate)
+
+    def set_rate(self, rate=None, per_host_rate=None):
+        # Either rate may be changed while transfers run; None or 0 removes that cap
+        self.global_bucket.set_rate(rate)
+        with self.lock:
+            self.per_host_rate = per_host_rate
+            buckets = list(self.host_buckets.values())
+        for bucket in buckets:
+            bucket.set_rate(per_host_rate)
+
+    def _host_bucket(self, uri):
+        host = urlsplit(uri).netloc
+        with self.lock:
+            bucket = self.host_buckets.get(host)
+            if bucket is None:
+                bucket = self.host_buckets[host] = TokenBucket(self.per_host_rate, self.burst_s)
+            return bucket
+
+    def reserve(self, uri, nbytes):
+        if not self.active:
+            return 0.0
+        return max(self.global_bucket.reserve(nbytes), self._host_bucket(uri).reserve(nbytes))
+
+    def chunk_size(self, chunk_size):
+        return min(chunk_size, LIMITED_CHUNK_SIZE) if self.active else chunk_size
+
+
+def watch_rate_file(limiter, path, interval=1.0):
+    # Applies {"rate_mb_s": ..., "per_host_rate_mb_s": ...} from path whenever the file
+    # changes, so the cap can be moved while a run is going. Runs as a daemon thread.
+    def mb_s(value):
+        return value * MB if value else None
+
+    def watch():
+        seen = None
+        while True:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if mtime != seen:
+                    seen = mtime
+                    with open(path) as f:
+                        settings = json.load(f)
+                    limiter.set_rate(mb_s(settings.get('rate_mb_s')), mb_s(settings.get('per_host_rate_mb_s')))
+                    logging.info(f"Bandwidth caps from {path}: {settings}")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, AttributeError) as e:
+                logging.warning(f"Ignoring bandwidth settings in {path}: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import threading
+import subprocess
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from main import MODES
+from telemetry import percentile
+
+# Hermetic benchmark for the download modes in main.py.
+# Serves generated Divvy-style zips from a local HTTP server that can add per-request
+# latency and a per-request bandwidth cap, runs every mode against it in a fresh
+# subprocess and working directory, and prints one JSON report. Per-file latency is
+# taken from each run's own telemetry; the server's view is kept as a cross-check.
+#
+#   python3 benchmark.py --files 6 --size-mb 20 --latency-ms 50 --bandwidth-mbps 20
+
+MAIN_DIR = os.path.dirname(os.path.abspath(__file__))
+SEND_CHUNK = 64 * 1024
+
+# Runs inside the subprocess for one mode. Reports its own wall time, CPU time (the
+# extraction pool's children included) and peak memory on stdout.
+RUNNER = """
+import os, sys, json, time
+sys.path.insert(0, sys.argv[1])
+import main
+main.download_uris = json.loads(sys.argv[3])
+start = time.perf_counter()
+main.run_mode(sys.argv[2])
+wall = time.perf_counter() - start
+cpu = os.times()
+peak_children = None
+if main.resource is not None:
+    peak_children = main.resource.getrusage(main.resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_children /= 1024 * 1024 if sys.platform == 'darwin' else 1024
+print(json.dumps({
+    'wall_s': wall,
+    'cpu_user_s': cpu.user + cpu.children_user,
+    'cpu_system_s': cpu.system + cpu.children_system,
+    'peak_rss_mb': main.peak_rss_mb(),
+    'peak_child_rss_mb': peak_children,
+}))
+"""
+
+
+#--------- Test Data ------------
+def generate_archives(data_dir, files, size_mb):
+    # Stored (uncompressed) random payloads so the archive size is exactly what was asked for
+    names = []
+    for i in range(files):
+        name = f"Divvy_Trips_{2018 + i // 4}_Q{i % 4 + 1}"
+        with zipfile.ZipFile(os.path.join(data_dir, f"{name}.zip"), 'w', zipfile.ZIP_STORED) as zip_ref:
+            with zip_ref.open(f"{name}.csv", 'w') as member:
+                remaining = int(size_mb * 1024 * 1024)
+                while remaining > 0:
+                    block = os.urandom(min(remaining, 1024 * 1024))
+                    member.write(block)
+                    remaining -= len(block)
+        names.append(f"{name}.zip")
+    return names
+
+
+#--------- Stand-in Server ------------
+class ArchiveHandler(BaseHTTPRequestHandler):
+    # Subset of what S3 does for these files: HEAD, single byte ranges, ETag /
+    # Last-Modified validators and 404 for anything not generated.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        start = time.perf_counter()
+        server = self.server
+        time.sleep(server.latency_s)
+
+        name = self.path.split('?')[0].lstrip('/')
+        path = os.path.join(server.data_dir, name)
+        if not name or not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            server.record(name, start, 0, 404)
+            return
+
+        size = os.path.getsize(path)
+        mtime = os.path.getmtime(path)
+        etag = f'"{size:x}-{int(mtime):x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            server.record(name, start, 0, 304)
+            return
+
+        first, last, status = 0, size - 1, 200
+        byte_range = self.headers.get('Range', '')
+        if_range = self.headers.get('If-Range')
+        if byte_range.startswith('bytes=') and (if_range is None or if_range == etag):
+            start_text, _, end_text = byte_range[len('bytes='):].partition('-')
+            first = int(start_text)
+            last = min(int(end_text), size - 1) if end_text else size - 1
+            if first >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                server.record(name, start, 0, 416)
+                return
+            status = 206
+
+        length = last - first + 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {first}-{last}/{size}")
+        self.end_headers()
+
+        sent = 0
+        if send_body:
+            try:
+                sent = self.send_file(path, first, length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        server.record(name, start, sent, status)
+
+    def send_file(self, path, offset, length):
+        # Paced so each response stays under the configured bandwidth cap
+        rate = self.server.bandwidth_bps
+        sent = 0
+        began = time.perf_counter()
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while sent < length:
+                chunk = f.read(min(SEND_CHUNK, length - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if rate:
+                    ahead = sent / rate - (time.perf_counter() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        return sent
+
+
+class ArchiveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data_dir, latency_ms=0, bandwidth_mbps=0):
+        super().__init__(('127.0.0.1', 0), ArchiveHandler)
+        self.data_dir = data_dir
+        self.latency_s = latency_ms / 1000
+        self.bandwidth_bps = bandwidth_mbps * 1024 * 1024
+        self.lock = threading.Lock()
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, name, start, nbytes, status):
+        with self.lock:
+            self.requests.append({'name': name, 'start': start, 'end': time.perf_counter(),
+                                  'bytes': nbytes, 'status': status})
+
+    def take_requests(self):
+        with self.lock:
+            requests, self.requests = self.requests, []
+        return requests
+
+
+#--------- Reporting ------------
+def latency_summary(latencies):
+    return {
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else None,
+    }
+
+
+def client_latencies(work_dir):
+    # Per downloaded file, as the client saw it: request sent to last byte received
+    # (time to first byte plus transfer time), from the run's telemetry_*.jsonl
+    latencies = []
+    log_dir = os.path.join(work_dir, 'logs')
+    for name in os.listdir(log_dir):
+        if not (name.startswith('telemetry_') and name.endswith('.jsonl')):
+            continue
+        with open(os.path.join(log_dir, name)) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get('type') == 'file' and record.get('transfer_s') is not None:
+                    latencies.append(((record.get('ttfb_s') or 0) + record['transfer_s']) * 1000)
+    return latencies
+
+
+def file_latencies(requests):
+    # Server side, per file: first request in (HEAD probe or first segment) to last
+    # byte handed to the socket. Only a cross-check for client_latencies: it ends when
+    # the bytes enter the send buffer, not when the client has them.
+    spans = {}
+    for request in requests:
+        if request['status'] == 404:
+            continue
+        first, last = spans.get(request['name'], (request['start'], request['end']))
+        spans[request['name']] = (min(first, request['start']), max(last, request['end']))
+    return [(last - first) * 1000 for first, last in spans.values()]
+
+
+def run_mode(mode, uris):
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    try:
+        result = subprocess.run(
+            [sys.executable, '-c', RUNNER, MAIN_DIR, mode, json.dumps(uris)],
+            cwd=work_dir, capture_output=True, text=True, check=True,
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        download_dir = os.path.join(work_dir, 'Downloaded_files')
+        stats['files_extracted'] = sum(1 for name in os.listdir(download_dir) if name.endswith('.csv'))
+        stats['latency_ms'] = latency_summary(client_latencies(work_dir))
+        return stats
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark(modes, files, size_mb, missing, latency_ms, bandwidth_mbps):
+    data_dir = tempfile.mkdtemp(prefix='bench_data_')
+    server = None
+    try:
+        names = generate_archives(data_dir, files, size_mb)
+        server = ArchiveServer(data_dir, latency_ms, bandwidth_mbps)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Dead links like the Divvy_Trips_2220_Q1.zip entry in main.py
+        uris = [f"{server.base_url}/{name}" for name in names]
+        uris += [f"{server.base_url}/Divvy_Trips_{2220 + i}_Q1.zip" for i in range(missing)]
+
+        report = {
+            'config': {'files': files, 'size_mb': size_mb, 'missing': missing,
+                       'latency_ms': latency_ms, 'bandwidth_mbps': bandwidth_mbps},
+            'modes': {},
+        }
+        for mode in modes:
+            server.take_requests()
+            stats = run_mode(mode, uris)
+            requests = server.take_requests()
+            total_bytes = sum(request['bytes'] for request in requests)
+            stats.update({
+                'bytes': total_bytes,
+                'throughput_mb_s': total_bytes / 1024 / 1024 / stats['wall_s'] if stats['wall_s'] else None,
+                'requests': len(requests),
+                'not_found': sum(1 for request in requests if request['status'] == 404),
+                'server_latency_ms': latency_summary(file_latencies(requests)),
+            })
+            report['modes'][mode] = stats
+        return report
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the download modes against a local server.")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--files', type=int, default=6, help="number of archives to serve")
+    parser.add_argument('--size-mb', type=float, default=20, help="size of each archive")
+    parser.add_argument('--missing', type=int, default=1, help="number of URIs that return 404")
+    parser.add_argument('--latency-ms', type=float, default=0, help="delay before each response")
+    parser.add_argument('--bandwidth-mbps', type=float, default=0,
+                        help="per-request cap in MB/s, 0 for unlimited")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = benchmark(args.modes, args.files, args.size_mb, args.missing,
+                       args.latency_ms, args.bandwidth_mbps)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import time
+import json
+import socket
+import sqlite3
+from contextlib import closing
+
+# Shared job table so several worker processes or containers split one URI list
+# between them. It is a SQLite file on a volume every worker mounts. Claims run
+# inside BEGIN IMMEDIATE, so two workers can never take the same URI. Running
+# jobs carry a heartbeat; a job whose heartbeat is older than the lease belongs to
+# a crashed worker and goes back up for grabs.
+#
+#   table = JobTable('Downloaded_files/jobs.db')
+#   table.add(uris)                    # starts a new run once the last one is finished
+#   uri = table.claim(worker_id)       # None when nothing is left
+#   table.finish(uri, worker_id, 'done', {...})
+
+LEASE_S = 120
+MAX_ATTEMPTS = 3
+BUSY_TIMEOUT_MS = 30_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    uri TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat REAL,
+    result TEXT,
+    updated REAL
+)
+"""
+
+
+def worker_name():
+    # Unique per process and per container (containers get their own hostname)
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobTable:
+    # A fresh connection per call, so one table can be used from any thread
+    def __init__(self, path, lease_s=LEASE_S, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        with self.connect() as db:
+            db.execute(SCHEMA)
+
+    def connect(self):
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        # sqlite3's own context manager ends a transaction but doesn't close
+        return closing(db)
+
+    def add(self, uris):
+        # Seeds the table. While a run is going (anything pending or running) it only
+        # adds missing URIs, so every worker can seed it with the same list. Once
+        # nothing is left the last run is over, and seeding starts a new one: these
+        # URIs go back to pending with fresh attempts, so changed files and fixed links
+        # are fetched again; unchanged ones only cost a conditional request.
+        # Returns True if it started a new run.
+        now = time.time()
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                active = db.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'running')").fetchone()[0]
+                total = db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                new_run = not active and total > 0
+                if new_run:
+                    db.executemany("UPDATE jobs SET state = 'pending', worker = NULL, attempts = 0, "
+                                   "heartbeat = NULL, result = NULL, updated = ? WHERE uri = ?",
+                                   [(now, uri) for uri in uris])
+                db.executemany("INSERT OR IGNORE INTO jobs (uri, updated) VALUES (?, ?)",
+                               [(uri, now) for uri in uris])
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return new_run
+
+    def claim(self, worker):
+        # Takes the oldest pending job, or a running one whose worker stopped
+        # heartbeating. Returns its URI, or None if there is nothing to take.
+        now = time.time()
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Stale jobs that already used up their attempts are failed, not retried
+                db.execute("UPDATE jobs SET state = 'failed', worker = NULL, updated = ? "
+                           "WHERE state = 'running' AND heartbeat < ? AND attempts >= ?",
+                           (now, now - self.lease_s, self.max_attempts))
+                row = db.execute("SELECT uri FROM jobs WHERE state = 'pending' "
+                                 "OR (state = 'running' AND heartbeat < ?) ORDER BY rowid LIMIT 1",
+                                 (now - self.lease_s,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, "
+                               "heartbeat = ?, updated = ? WHERE uri = ?", (worker, now, now, row[0]))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return row[0] if row is not None else None
+
+    def heartbeat(self, worker):
+        # One statement renews every job this worker holds
+        now = time.time()
+        with self.connect() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE worker = ? AND state = 'running'", (now, worker))
+
+    def finish(self, uri, worker, state, result=None):
+        # state is 'done', 'failed' or 'retry'. A retry goes back to pending until it
+        # has used MAX_ATTEMPTS, then fails. Ignored if another worker reclaimed the job.
+        now = time.time()
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            if state == 'retry':
+                db.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                           "worker = NULL, result = ?, updated = ? WHERE uri = ? AND worker = ?",
+                           (self.max_attempts, json.dumps(result), now, uri, worker))
+            else:
+                db.execute("UPDATE jobs SET state = ?, worker = NULL, result = ?, updated = ? "
+                           "WHERE uri = ? AND worker = ?", (state, json.dumps(result), now, uri, worker))
+            db.execute("COMMIT")
+
+    def counts(self):
+        with self.connect() as db:
+            return dict(db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
@@ -1,33 +1,102 @@
 import os
-import requests
+import re
+import sys
+import json
+import time
+import hashlib
+import heapq
+import queue
+import argparse
+import threading
 import zipfile
-import asyncio
-import aiohttp
-import aiofiles
 import logging
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-import unittest
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from telemetry import Telemetry, setup_queue_logging, worker_pool_logging, profiled
+from bandwidth import BandwidthLimiter, watch_rate_file, MB
+from shared_files import update_json
 
-# Setup logging directory and format
+# requests (sync/threaded/segmented) and asyncio/aiohttp/aiofiles (async) are imported inside
+# the functions that use them, so a run only pays for the backend its mode needs.
+# Importing this module has no side effects; configure() creates the directories,
+# starts logging and loads the manifest.
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Log directory; configure() names the files after the run's start time
 LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-timestamp = datetime.now().strftime('%d-%m-%Y_%H-%M-%S')
-log_file_name = os.path.join(LOG_DIR,f"log_file_{timestamp}")
-
-# Logging Configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file_name),
-        logging.StreamHandler()
-    ]
-)
-
-# Download Target Folder
+timestamp = None
+
+# Download Target Folder (--output-dir)
 DOWNLOAD_DIR = "Downloaded_files"
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+# Bytes read from the socket and written to disk per step, so memory per download
+# stays constant however large the archive is.
+CHUNK_SIZE = 1024 * 1024
+
+# Extraction runs in its own process pool so unzipping never blocks the event loop or
+# the download workers. The queue is bounded so downloads pause when extraction falls
+# behind instead of piling archives up on disk.
+EXTRACT_WORKERS = os.cpu_count() or 1
+EXTRACT_QUEUE_SIZE = 2 * EXTRACT_WORKERS
+
+# Segmented mode splits one archive into byte ranges fetched over parallel connections.
+# Files too small to give every segment MIN_SEGMENT_SIZE use fewer segments.
+SEGMENTS = 4
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Per-URI record of ETag, Last-Modified, size and extracted outputs, so reruns can send
+# conditional requests and skip unchanged files. In-flight transfers are written to
+# <name>.part and resumed with a Range request if the run is interrupted.
+MANIFEST_PATH = os.path.join(DOWNLOAD_DIR, "manifest.json")
+
+# Bounds for the adaptive controller that sets how many downloads run at once.
+# Connection pools are sized for MAX_CONCURRENCY so no transfer waits on a socket.
+MIN_CONCURRENCY = 1
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+# Optional bandwidth caps in MB/s, shared by every transfer in every mode: a global one
+# and one per host (see bandwidth.py). Unset means unthrottled.
+RATE_LIMIT_MB_S = float(os.environ.get('RATE_LIMIT_MB_S') or 0) or None
+HOST_RATE_LIMIT_MB_S = float(os.environ.get('HOST_RATE_LIMIT_MB_S') or 0) or None
+
+# Optional columnar cache: when set, every extracted quarter is also written as typed,
+# compressed Parquet under this directory (see trips.py, needs pyarrow).
+PARQUET_DIR = os.environ.get('PARQUET_DIR')
+# With DIRECT_TO_PARQUET=1 the CSV is never written: the zip member is decompressed and
+# parsed as a stream straight into PARQUET_DIR, then the zip is deleted.
+DIRECT_TO_PARQUET = os.environ.get('DIRECT_TO_PARQUET') == '1'
+# When set, each run ends by folding any new quarters into the per-quarter trip
+# aggregates kept here (see aggregates.py), read from PARQUET_DIR or else the CSVs
+AGGREGATE_DIR = os.environ.get('AGGREGATE_DIR')
+
+# Every body is hashed (SHA-256) and counted as the chunks arrive. One that doesn't
+# match Content-Length, or the MD5 in an S3 single-part ETag, is discarded and fetched
+# again straight away, up to DOWNLOAD_ATTEMPTS times in all. The hash goes in the
+# manifest so content that is already extracted is never unpacked twice.
+DOWNLOAD_ATTEMPTS = 3
+
+# Every URI is HEAD-probed concurrently before the first download. Dead links are
+# dropped without taking a download slot and the rest are handed out largest first.
+# Predicted finish times use each mode's per-stream rate from the previous run
+# (SCHEDULE_STATS in the output directory), or DEFAULT_STREAM_MB_S the first time.
+PREFLIGHT = True
+PREFLIGHT_WORKERS = 16
+DEFAULT_STREAM_MB_S = 5.0
+SCHEDULE_STATS = "schedule.json"
+
+# PROFILE=cprofile or PROFILE=sample profiles each run into LOG_DIR
+# (profile_<mode>_<timestamp>.prof/.txt, or .folded stacks from every thread)
+PROFILE = os.environ.get('PROFILE') or None
+# Threads per archive verifying and unpacking members (zlib and crc32 release the GIL)
+MEMBER_WORKERS = 4
 
 
 # List of files to download
@@ -41,77 +110,1109 @@ download_uris = [
     "https://divvy-tripdata.s3.amazonaws.com/Divvy_Trips_2220_Q1.zip",
 ]
 
+telemetry = Telemetry()
+# Set up from RATE_LIMIT_MB_S / HOST_RATE_LIMIT_MB_S (or the CLI) by main()
+limiter = BandwidthLimiter()
+
+
 def get_file_name(uri):
     return uri.split('/')[-1][:-4]
 
 
-def extract_zip(zip_path):
+def extract_member(zip_path, name, extract_to=None):
+    # Own handle per thread. Reading a member to the end checks its CRC-32, so a
+    # corrupt member raises BadZipFile here rather than going unnoticed.
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extract(name, extract_to)
+
+
+def extract_zip(zip_path, extract_to=None):
+    # Returns the extracted member names, or None if the archive could not be unpacked.
+    # Members are decompressed and CRC-checked in parallel; if any fails, everything
+    # extracted from this archive and the archive itself are removed.
+    extract_to = extract_to or DOWNLOAD_DIR
+    outputs = []
     try:
         with zipfile.ZipFile(zip_path,'r') as zip_ref:
-            zip_ref.extractall(DOWNLOAD_DIR)
+            outputs = [info.filename for info in zip_ref.infolist() if not info.is_dir()]
+        with ThreadPoolExecutor(max_workers=max(1, min(MEMBER_WORKERS, len(outputs)))) as executor:
+            list(executor.map(partial(extract_member, zip_path, extract_to=extract_to), outputs))
         os.remove(zip_path)
         logging.info(f"Extracted and deleted: {zip_path}")
+        return outputs
+    except zipfile.BadZipFile as e:
+        logging.error(f"Invalid ZIP file: {zip_path}: {e}")
+        for name in outputs:
+            discard(os.path.join(extract_to, name))
+        discard(zip_path)
+    except OSError as e:
+        logging.error(f"Extraction failed for {zip_path}: {e}")
+    return None
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def stream_zip_to_parquet(zip_path, parquet_dir):
+    # Returns (outputs, conversions) like process_archive; outputs are absolute
+    # Parquet paths so the download manifest can check they still exist.
+    import trips
+    try:
+        conversions = trips.convert_zip(zip_path, parquet_dir)
+        os.remove(zip_path)
+        logging.info(f"Streamed to Parquet and deleted: {zip_path}")
     except zipfile.BadZipFile:
         logging.error(f"Invalid ZIP file: {zip_path}")
+        return None, []
+    except Exception as e:
+        logging.error(f"Parquet streaming failed for {zip_path}: {e}")
+        return None, []
+    outputs = [os.path.abspath(os.path.join(parquet_dir, info['path'])) for info in conversions]
+    return outputs, conversions
+
+
+def process_archive(zip_path, extract_to=None, parquet_dir=None, direct=False):
+    # The unit of work in the extraction pool: unzip, then optionally convert the
+    # CSVs to Parquet (or, with direct, go from zip to Parquet without the CSV).
+    # Returns (outputs, conversions); the parent records both.
+    extract_to = extract_to or DOWNLOAD_DIR
+    if parquet_dir and direct:
+        return stream_zip_to_parquet(zip_path, parquet_dir)
+    outputs = extract_zip(zip_path, extract_to)
+    conversions = []
+    if outputs and parquet_dir:
+        import trips  # pyarrow is only needed when the Parquet cache is on
+        for name in outputs:
+            if not name.endswith('.csv') or name.startswith('__MACOSX'):
+                continue
+            try:
+                conversions.append(trips.convert_csv(os.path.join(extract_to, name), parquet_dir))
+                logging.info(f"Converted to Parquet: {name}")
+            except Exception as e:
+                logging.error(f"Parquet conversion failed for {name}: {e}")
+    return outputs, conversions
+
+
+def timed_process_archive(zip_path, extract_to=None, parquet_dir=None, direct=False):
+    # What the extraction pool actually runs: (process_archive result, seconds taken)
+    start = time.perf_counter()
+    result = process_archive(zip_path, extract_to, parquet_dir, direct)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    # High-water mark of resident memory for this process, None where unsupported
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+#--------- Connection Pools ------------
+# One adapter (and so one urllib3 pool) shared by every thread. Each thread gets its
+# own Session on top of it because Session state (cookies, adapters) isn't thread-safe.
+# Built on first use so modes that never touch requests don't import it.
+http_adapter = None
+adapter_lock = threading.Lock()
+session_local = threading.local()
+
+
+def get_http_adapter():
+    global http_adapter
+    with adapter_lock:
+        if http_adapter is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            http_adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=max(MAX_CONCURRENCY, SEGMENTS),
+                max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                                  allowed_methods=frozenset({'GET', 'HEAD'})),
+            )
+        return http_adapter
+
+
+def get_session():
+    session = getattr(session_local, 'session', None)
+    if session is None:
+        import requests
+        adapter = get_http_adapter()
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session_local.session = session
+    return session
+
+
+def make_connector():
+    import aiohttp
+    return aiohttp.TCPConnector(limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY,
+                                ttl_dns_cache=300, keepalive_timeout=30)
+
+
+def make_client_session():
+    import aiohttp
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    return aiohttp.ClientSession(connector=make_connector(), timeout=timeout)
+
+
+#--------- Adaptive Concurrency ------------
+class AdaptiveConcurrency:
+    # Limits in-flight downloads and moves the limit with measured results (AIMD).
+    # Each window of `limit` completed downloads is compared with the previous one:
+    # higher aggregate throughput adds a slot, lower throughput removes one, and an
+    # error rate above max_error_rate halves the limit.
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY,
+                 maximum=MAX_CONCURRENCY, max_error_rate=0.2):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_error_rate = max_error_rate
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._async_cond = None
+        self._last_rate = 0.0
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_done = 0
+        self._window_errors = 0
+
+    def _record(self, nbytes, ok):
+        self.in_flight -= 1
+        self._window_done += 1
+        self._window_bytes += nbytes
+        self._window_errors += 0 if ok else 1
+        if self._window_done < self.limit:
+            return
+
+        rate = self._window_bytes / max(time.monotonic() - self._window_start, 1e-6)
+        error_rate = self._window_errors / self._window_done
+        old_limit = self.limit
+        if error_rate > self.max_error_rate:
+            self.limit = max(self.minimum, self.limit // 2)
+        elif rate > self._last_rate * 1.05:
+            self.limit = min(self.maximum, self.limit + 1)
+        elif rate < self._last_rate * 0.9:
+            self.limit = max(self.minimum, self.limit - 1)
+        if self.limit != old_limit:
+            logging.info(f"Concurrency {old_limit} -> {self.limit} "
+                         f"({rate / 1024 / 1024:.2f} MB/s, {error_rate:.0%} errors)")
+        self._last_rate = rate
+        self._reset_window()
+
+    @staticmethod
+    def failure_result(error):
+        # What a failed download reports back: dead links (404 and other 4xx) say
+        # nothing about load, so they count as an empty success; timeouts, 429 and
+        # 5xx return None and count as errors.
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+        if status and 400 <= status < 500 and status not in (408, 429):
+            return 0
+        return None
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, nbytes, ok):
+        with self._cond:
+            self._record(nbytes, ok)
+            self._cond.notify_all()
+
+    async def acquire_async(self):
+        if self._async_cond is None:
+            import asyncio
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            await self._async_cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release_async(self, nbytes, ok):
+        async with self._async_cond:
+            self._record(nbytes, ok)
+            self._async_cond.notify_all()
+
+
+#--------- Download Manifest ------------
+def load_manifest(path=None):
+    try:
+        with open(path or MANIFEST_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+# Loaded by configure()
+manifest = {}
+manifest_lock = threading.Lock()
+# URIs this process changed since its last save
+manifest_dirty = set()
+
+
+def save_manifest(path=None):
+    # Callers hold manifest_lock. Only the entries this process changed are written
+    # over the file as it is on disk now, so entries other workers saved since we
+    # loaded survive; our copy is then replaced by the merged file. Readers don't
+    # take the lock, so the new dict is swapped in with one rebind and they see
+    # either the old copy or the new one, never a half-filled dict.
+    global manifest
+
+    def merge(on_disk):
+        for uri in manifest_dirty:
+            on_disk[uri] = manifest[uri]
+
+    merged = update_json(path or MANIFEST_PATH, merge)
+    manifest_dirty.clear()
+    manifest = merged
+
+
+def update_manifest(uri, **fields):
+    with manifest_lock:
+        manifest.setdefault(uri, {}).update(fields)
+        manifest_dirty.add(uri)
+        save_manifest()
+
+
+def outputs_present(entry):
+    outputs = entry.get('outputs')
+    return bool(outputs) and all(os.path.exists(os.path.join(DOWNLOAD_DIR, name)) for name in outputs)
+
+
+def conditional_headers(uri):
+    # Only worth asking "has it changed?" if last run's extracted files are still here
+    entry = manifest.get(uri, {})
+    headers = {}
+    if outputs_present(entry):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def request_headers(uri, part_path):
+    # Returns (offset, headers): a Range + If-Range request resuming part_path when a
+    # partial transfer is on disk, otherwise a conditional GET.
+    partial = manifest.get(uri, {}).get('partial') or {}
+    etag = partial.get('etag')
+    validator = etag if etag and not etag.startswith('W/') else partial.get('last_modified')
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and validator:
+        return offset, {'Range': f"bytes={offset}-", 'If-Range': validator}
+    return 0, conditional_headers(uri)
+
+
+def start_transfer(uri, status, headers):
+    validators = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+    if status != 206:
+        # A fresh body: remember its validators so an interrupted transfer can resume
+        update_manifest(uri, partial=validators)
+    return validators
+
+
+def record_extracted(uri, validators, outputs):
+    # The entry only becomes reusable once its archive has been unpacked
+    if outputs is None:
+        return
+    with manifest_lock:
+        entry = manifest.setdefault(uri, {})
+        entry.update(validators)
+        entry['outputs'] = outputs
+        entry.pop('partial', None)
+        manifest_dirty.add(uri)
+        save_manifest()
+
+
+def record_processed(uri, validators, result):
+    outputs, conversions = result
+    record_extracted(uri, validators, outputs)
+    if conversions:
+        import trips
+        trips.record_conversions(PARQUET_DIR, conversions)
+
+
+def finish_processing(uri, validators, result, seconds):
+    record_processed(uri, validators, result)
+    outcome = 'ok' if result[0] is not None else 'extract_failed'
+    telemetry.finish(uri, outcome, extract_s=seconds)
+
+
+def process_and_record(uri, path, validators):
+    # Extraction inline, for callers without an extract stage
+    finish_processing(uri, validators, *timed_process_archive(path, DOWNLOAD_DIR, PARQUET_DIR, DIRECT_TO_PARQUET))
+
+
+def extract_done(uri, validators, future):
+    if future.cancelled() or future.exception() is not None:
+        telemetry.finish(uri, 'extract_failed', error=repr(future.exception()) if not future.cancelled() else 'cancelled')
+        return
+    finish_processing(uri, validators, *future.result())
+
+
+def find_duplicate(sha256):
+    # Any manifest entry whose extracted outputs came from identical bytes
+    with manifest_lock:
+        entries = list(manifest.values())
+    for entry in entries:
+        if entry.get('sha256') == sha256 and outputs_present(entry):
+            return entry
+    return None
+
+
+def reuse_duplicate(uri, path, validators):
+    # A new ETag (or another URI) can still carry bytes that are already unpacked;
+    # then the archive is dropped and the existing outputs are recorded for uri.
+    entry = find_duplicate(validators.get('sha256')) if validators.get('sha256') else None
+    if entry is None:
+        return False
+    os.remove(path)
+    record_extracted(uri, validators, list(entry['outputs']))
+    logging.info(f"Content already extracted (sha256 {validators['sha256'][:12]}), skipped: {uri}")
+    telemetry.finish(uri, 'duplicate')
+    return True
+
+
+def hand_off(uri, path, validators, extract_queue=None):
+    if reuse_duplicate(uri, path, validators):
+        return
+    if extract_queue is None:
+        process_and_record(uri, path, validators)
+    else:
+        extract_queue.put((uri, path, validators))
+
+
+#--------- Extraction Stage ------------
+def fail_extract(uri, error):
+    logging.error(f"Not extracted, extract pool unavailable ({error}): {uri}")
+    telemetry.finish(uri, 'extract_failed', error=error)
+
+
+def run_extract_stage(extract_queue, extract_to=None):
+    # Pulls downloaded archives off the queue and unzips them in a process pool.
+    # At most EXTRACT_WORKERS archives are in flight, so a slow extract backs up
+    # the bounded queue and throttles the downloaders. None is the stop signal.
+    # extract_to is resolved here so worker processes never depend on configure().
+    # A worker process that dies (OOM-killed, say) breaks the pool: the archives in
+    # it fail through extract_done, and submit refuses every later one, which is
+    # failed as it arrives so the stage keeps draining and no downloader blocks.
+    extract_to = extract_to or DOWNLOAD_DIR
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, **worker_pool_logging()) as pool:
+        pending = set()
+        while True:
+            item = extract_queue.get()
+            if item is None:
+                break
+            uri, path, validators = item
+            try:
+                future = pool.submit(timed_process_archive, path, extract_to, PARQUET_DIR, DIRECT_TO_PARQUET)
+            except Exception as e:
+                fail_extract(uri, repr(e))
+                continue
+            future.add_done_callback(partial(extract_done, uri, validators))
+            pending.add(future)
+            if len(pending) >= EXTRACT_WORKERS:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+        wait(pending)
+
+
+@contextmanager
+def extract_pipeline(extract_to=None):
+    extract_queue = queue.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+    extractor = threading.Thread(target=run_extract_stage, args=(extract_queue, extract_to))
+    extractor.start()
+    try:
+        yield extract_queue
+    finally:
+        extract_queue.put(None)
+        extractor.join()
+
+
+async def async_extract_and_record(pool, uri, path, validators, extract_to):
+    import asyncio
+    try:
+        future = asyncio.get_running_loop().run_in_executor(
+            pool, timed_process_archive, path, extract_to, PARQUET_DIR, DIRECT_TO_PARQUET)
+    except Exception as e:
+        # Broken pool, as in run_extract_stage
+        fail_extract(uri, repr(e))
+        return
+    await asyncio.wait([future])
+    # The manifest writes take a cross-process file lock, so they never run on the loop
+    await asyncio.to_thread(extract_done, uri, validators, future)
+
+
+async def async_extract_stage(extract_queue, extract_to=None):
+    # Same as run_extract_stage, but awaits the pool so the event loop keeps
+    # serving transfers while archives decompress.
+    import asyncio
+    extract_to = extract_to or DOWNLOAD_DIR
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, **worker_pool_logging()) as pool:
+        pending = set()
+        while True:
+            item = await extract_queue.get()
+            if item is None:
+                break
+            uri, path, validators = item
+            pending.add(asyncio.create_task(async_extract_and_record(pool, uri, path, validators, extract_to)))
+            if len(pending) >= EXTRACT_WORKERS:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.wait(pending)
+
+
+#--------- Integrity ------------
+class CorruptTransfer(ValueError):
+    pass
+
+
+class TransferCheck:
+    # SHA-256 and byte count of one response body, updated chunk by chunk as it is
+    # written, plus MD5 when the ETag is a plain S3 content MD5. A resumed (206)
+    # transfer first hashes the bytes already in part_path, the one case that reads
+    # back from disk.
+    def __init__(self, status, headers, part_path=None):
+        self.sha256 = hashlib.sha256()
+        etag = (headers.get('ETag') or '').strip('"')
+        self.etag_md5 = etag if re.fullmatch(r'[0-9a-f]{32}', etag) else None
+        self.md5 = hashlib.md5(usedforsecurity=False) if self.etag_md5 else None
+        length = headers.get('Content-Length')
+        # Bodies with a Content-Encoding are counted after decoding, so can't be compared
+        self.expected = int(length) if length and not headers.get('Content-Encoding') else None
+        self.received = 0
+        self.prefix = 0
+        if status == 206 and part_path:
+            with open(part_path, 'rb') as f:
+                for chunk in iter(partial(f.read, CHUNK_SIZE), b''):
+                    self._hash(chunk)
+                    self.prefix += len(chunk)
+
+    def _hash(self, chunk):
+        self.sha256.update(chunk)
+        if self.md5 is not None:
+            self.md5.update(chunk)
+
+    def update(self, chunk):
+        self._hash(chunk)
+        self.received += len(chunk)
+
+    def verify(self):
+        # Raises CorruptTransfer; returns the hex SHA-256 of the whole file
+        if self.expected is not None and self.received != self.expected:
+            raise CorruptTransfer(f"received {self.received} bytes, Content-Length was {self.expected}")
+        if self.md5 is not None and self.md5.hexdigest() != self.etag_md5:
+            raise CorruptTransfer(f"MD5 {self.md5.hexdigest()} does not match ETag {self.etag_md5}")
+        return self.sha256.hexdigest()
+
+
+def retry_transfer(uri, part_path, error, attempt):
+    # True if the transfer should be fetched again right away. Bytes that failed
+    # verification are thrown away; a body cut off mid-stream keeps its .part so
+    # the retry resumes from it.
+    if isinstance(error, CorruptTransfer):
+        discard(part_path)
+    if attempt >= DOWNLOAD_ATTEMPTS:
+        logging.error(f"Giving up on {uri} after {attempt} attempts: {error}")
+        return False
+    logging.warning(f"Corrupt or truncated transfer, retrying ({attempt}/{DOWNLOAD_ATTEMPTS}): {uri}: {error}")
+    return True
+
+
+#--------- Pre-flight Scheduling ------------
+# accepts_ranges and validators come from the same HEAD; segmented mode and the
+# unchanged check reuse them instead of asking again
+Probe = namedtuple('Probe', ['uri', 'status', 'size', 'accepts_ranges', 'validators'],
+                   defaults=(False, {}))
+# Filled by apply_schedule() with the probe of every URI it schedules
+preflight_probes = {}
+
+
+def is_dead(status):
+    # Permanent client errors; 405 just means the server doesn't do HEAD
+    return status is not None and 400 <= status < 500 and status not in (405, 408, 429)
+
+
+def probe_uri(uri):
+    # A failed probe (timeout, 5xx, no HEAD) leaves size unknown; the download decides
+    try:
+        status, size, accepts_ranges, validators = probe_ranges(uri)
+        return Probe(uri, status, size or None, accepts_ranges, validators)
+    except Exception as e:
+        response = getattr(e, 'response', None)
+        return Probe(uri, getattr(response, 'status_code', None), None)
+
+
+async def async_probe_uri(session, uri):
+    try:
+        async with session.head(uri, allow_redirects=True) as resp:
+            accepts_ranges = resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            validators = {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+            return Probe(uri, resp.status, resp.content_length or None, accepts_ranges, validators)
+    except Exception:
+        return Probe(uri, None, None)
+
+
+def unchanged_since_last_run(probe):
+    # The HEAD already says what a conditional GET would: same ETag (or, without
+    # one, same Last-Modified) as the last download, and its files still extracted
+    entry = manifest.get(probe.uri, {})
+    if probe.status != 200 or not outputs_present(entry):
+        return False
+    etag = probe.validators.get('etag')
+    if etag:
+        return etag == entry.get('etag')
+    last_modified = probe.validators.get('last_modified')
+    return bool(last_modified) and last_modified == entry.get('last_modified')
+
+
+def load_stream_rates():
+    try:
+        with open(os.path.join(DOWNLOAD_DIR, SCHEDULE_STATS)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def plan_schedule(probes, workers, stream_mb_s):
+    # Longest processing time first: largest files start first, unknown sizes before
+    # everything (they may be the largest). Returns (ordered probes, predicted
+    # seconds from now until each one is downloaded) from a simulated run on
+    # `workers` slots at stream_mb_s each; unknown sizes get no prediction.
+    ordered = sorted(probes, key=lambda probe: -probe.size if probe.size is not None else -float('inf'))
+    rate = stream_mb_s * 1024 * 1024
+    slots = [0.0] * max(1, workers)
+    predicted = {}
+    for probe in ordered:
+        start = heapq.heappop(slots)
+        finish = start + (probe.size or 0) / rate
+        if probe.size is not None:
+            predicted[probe.uri] = finish
+        heapq.heappush(slots, finish)
+    return ordered, predicted
+
+
+def apply_schedule(probes, workers):
+    # Drops dead links and files unchanged since the last run, orders the rest and
+    # records the predictions; returns the URIs to download
+    live = []
+    for probe in probes:
+        if is_dead(probe.status):
+            logging.warning(f"Dropped before download, HEAD returned {probe.status}: {probe.uri}")
+            telemetry.finish(probe.uri, 'dead', status=probe.status)
+        elif unchanged_since_last_run(probe):
+            logging.info(f"Unchanged, skipped before download: {probe.uri}")
+            telemetry.finish(probe.uri, 'unchanged')
+        else:
+            preflight_probes[probe.uri] = probe
+            live.append(probe)
+    stream_mb_s = load_stream_rates().get(telemetry.mode, DEFAULT_STREAM_MB_S)
+    ordered, predicted = plan_schedule(live, workers, stream_mb_s)
+    offset = telemetry.elapsed()
+    for probe in ordered:
+        fields = {'size': probe.size}
+        if probe.uri in predicted:
+            fields['predicted_done_s'] = offset + predicted[probe.uri]
+        telemetry.update(probe.uri, **fields)
+    if predicted:
+        logging.info(f"Scheduled {len(ordered)} files largest first on {workers} stream(s) at "
+                     f"{stream_mb_s:.1f} MB/s each; predicted download makespan "
+                     f"{offset + max(predicted.values()):.1f}s")
+    return [probe.uri for probe in ordered]
+
+
+def schedule_downloads(uris, workers):
+    if not PREFLIGHT:
+        return list(uris)
+    with ThreadPoolExecutor(max_workers=min(PREFLIGHT_WORKERS, len(uris)) or 1) as executor:
+        probes = list(executor.map(probe_uri, uris))
+    return apply_schedule(probes, workers)
+
+
+async def async_schedule_downloads(session, uris, workers):
+    import asyncio
+    if not PREFLIGHT:
+        return list(uris)
+    probes = await asyncio.gather(*(async_probe_uri(session, uri) for uri in uris))
+    return apply_schedule(probes, workers)
+
+
+def report_schedule(records):
+    # Predicted vs actual download finish per file, and the per-stream rate this
+    # mode achieved, saved for the next run's predictions. Returns the summary fields.
+    compared = [record for record in records if 'predicted_done_s' in record and 'downloaded_s' in record]
+    for record in compared:
+        logging.info(f"{get_file_name(record['uri'])}: predicted {record['predicted_done_s']:.1f}s, "
+                     f"actual {record['downloaded_s']:.1f}s")
+    fields = {}
+    if compared:
+        fields['predicted_makespan_s'] = max(record['predicted_done_s'] for record in compared)
+        fields['actual_makespan_s'] = max(record['downloaded_s'] for record in compared)
+        logging.info(f"Download makespan: predicted {fields['predicted_makespan_s']:.1f}s, "
+                     f"actual {fields['actual_makespan_s']:.1f}s")
+    timed = [record for record in records if record.get('transfer_s') and record.get('bytes')]
+    if timed:
+        rate = (sum(record['bytes'] for record in timed) / 1024 / 1024
+                / sum(record['transfer_s'] for record in timed))
+        # Merged under a lock: workers sharing the output directory all save here
+        update_json(os.path.join(DOWNLOAD_DIR, SCHEDULE_STATS), lambda rates: rates.update({telemetry.mode: rate}))
+    return fields
 
 
 #--------- SYNC Download ------------
-def sync_download(uri):
+def sync_download(uri, chunk_size=CHUNK_SIZE, extract_queue=None, attempt=1):
+    import requests
     file_name = get_file_name(uri)
     path = os.path.join(DOWNLOAD_DIR, file_name)
+    part_path = path + '.part'
+    telemetry.started(uri)
     try:
-        response = requests.get(uri)
-        response.raise_for_status()
-        with open(path, 'wb') as f:
-            f.write(response.content)
-        logging.info(f"Downloaded (sync): {uri}")
-        extract_zip(path)
+        offset, headers = request_headers(uri, part_path)
+        with get_session().get(uri, headers=headers, stream=True) as response:
+            # elapsed runs from sending the request to parsing the response headers
+            telemetry.first_byte(uri, response.elapsed.total_seconds())
+            body_start = time.perf_counter()
+            if response.status_code == 304:
+                logging.info(f"Unchanged, skipped (sync): {uri}")
+                telemetry.finish(uri, 'unchanged')
+                return 0
+            if response.status_code == 416:
+                # The partial file doesn't match what the server has any more
+                os.remove(part_path)
+                return sync_download(uri, chunk_size, extract_queue, attempt)
+            response.raise_for_status()
+            validators = start_transfer(uri, response.status_code, response.headers)
+            check = TransferCheck(response.status_code, response.headers, part_path)
+            with open(part_path, 'ab' if response.status_code == 206 else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=limiter.chunk_size(chunk_size)):
+                    f.write(chunk)
+                    check.update(chunk)
+                    delay = limiter.reserve(uri, len(chunk))
+                    if delay:
+                        time.sleep(delay)
+            validators['sha256'] = check.verify()
+        telemetry.transferred(uri, check.received, time.perf_counter() - body_start)
+        telemetry.update(uri, attempts=attempt)
+        os.replace(part_path, path)
+        validators['size'] = os.path.getsize(path)
+        resumed = f" (resumed at byte {offset})" if response.status_code == 206 else ""
+        logging.info(f"Downloaded (sync): {uri}{resumed}")
+        hand_off(uri, path, validators, extract_queue)
+        return validators['size'] - offset
+    except (CorruptTransfer, requests.exceptions.ChunkedEncodingError) as e:
+        if retry_transfer(uri, part_path, e, attempt):
+            return sync_download(uri, chunk_size, extract_queue, attempt + 1)
+        telemetry.finish(uri, 'failed', attempts=attempt, error=str(e))
+        return AdaptiveConcurrency.failure_result(e)
     except Exception as e:
-        logging.error(f"Sync download failed for: {uri}: e")
+        logging.error(f"Sync download failed for: {uri}: {e}")
+        result = AdaptiveConcurrency.failure_result(e)
+        telemetry.finish(uri, 'dead' if result == 0 else 'failed', attempts=attempt, error=str(e))
+        return result
+
+
+def run_sync_download(chunk_size=CHUNK_SIZE):
+    uris = schedule_downloads(download_uris, workers=1)
+    with extract_pipeline() as extract_queue:
+        for uri in uris:
+            sync_download(uri, chunk_size, extract_queue)
         
 
+#--------- Segmented Download ------------
+def probe_ranges(uri, headers=None):
+    # HEAD request; returns (status, size, accepts_ranges, validators)
+    response = get_session().head(uri, headers=headers, allow_redirects=True)
+    response.raise_for_status()
+    size = int(response.headers.get('Content-Length', 0))
+    accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    return response.status_code, size, accepts_ranges, validators
+
+
+def plan_segments(size, segments=SEGMENTS, min_segment_size=MIN_SEGMENT_SIZE):
+    # Inclusive (start, end) byte ranges covering the whole file
+    count = max(1, min(segments, size // max(min_segment_size, 1)))
+    step = -(-size // count)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def fetch_segment(uri, path, start, end, chunk_size=CHUNK_SIZE, attempt=1):
+    # A segment that comes up short is fetched again on its own, not the whole file.
+    # Segments arrive out of order, so there is no inline SHA-256 in this mode; the
+    # byte counts here and the CRC check during extraction cover it.
+    import requests
+    try:
+        with get_session().get(uri, headers={'Range': f"bytes={start}-{end}"}, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise ValueError(f"Server ignored Range bytes={start}-{end}")
+            # Each segment has its own handle, so seek + write lands at a fixed offset
+            # without coordinating with the other segments.
+            with open(path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=limiter.chunk_size(chunk_size)):
+                    f.write(chunk)
+                    delay = limiter.reserve(uri, len(chunk))
+                    if delay:
+                        time.sleep(delay)
+                written = f.tell() - start
+        if written != end - start + 1:
+            raise CorruptTransfer(f"Segment bytes={start}-{end} short by {end - start + 1 - written} bytes")
+    except (CorruptTransfer, requests.exceptions.ChunkedEncodingError) as e:
+        if attempt >= DOWNLOAD_ATTEMPTS:
+            raise
+        logging.warning(f"Retrying segment bytes={start}-{end} ({attempt}/{DOWNLOAD_ATTEMPTS}): {uri}: {e}")
+        fetch_segment(uri, path, start, end, chunk_size, attempt + 1)
+
+
+def segmented_download(uri, segments=SEGMENTS, min_segment_size=MIN_SEGMENT_SIZE,
+                       chunk_size=CHUNK_SIZE, extract_queue=None, probe=None):
+    # probe is this URI's pre-flight HEAD; apply_schedule() has already skipped it if
+    # unchanged, so it stands in for the conditional HEAD here
+    file_name = get_file_name(uri)
+    path = os.path.join(DOWNLOAD_DIR, file_name)
+    telemetry.started(uri)
+    try:
+        if probe is not None and probe.status == 200 and probe.size:
+            status, size, accepts_ranges = probe.status, probe.size, probe.accepts_ranges
+            validators = dict(probe.validators)
+        else:
+            probe_start = time.perf_counter()
+            status, size, accepts_ranges, validators = probe_ranges(uri, conditional_headers(uri))
+            telemetry.first_byte(uri, time.perf_counter() - probe_start)
+        if status == 304:
+            logging.info(f"Unchanged, skipped (segmented): {uri}")
+            telemetry.finish(uri, 'unchanged')
+            return 0
+        ranges = plan_segments(size, segments, min_segment_size) if accepts_ranges and size else []
+        if len(ranges) <= 1:
+            logging.info(f"Range requests not usable for {uri}, falling back to a single stream")
+            return sync_download(uri, chunk_size, extract_queue)
+
+        # Preallocate so every segment can write into its slot as soon as bytes arrive
+        body_start = time.perf_counter()
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(fetch_segment, uri, path, start, end, chunk_size)
+                       for start, end in ranges]
+            for future in futures:
+                future.result()
+        logging.info(f"Downloaded (segmented x{len(ranges)}): {uri}")
+        telemetry.transferred(uri, size, time.perf_counter() - body_start)
+        telemetry.update(uri, segments=len(ranges))
+        validators['size'] = size
+        hand_off(uri, path, validators, extract_queue)
+        return size
+    except Exception as e:
+        logging.error(f"Segmented download failed for: {uri}: {e}")
+        telemetry.finish(uri, 'failed', error=str(e))
+        return AdaptiveConcurrency.failure_result(e)
+
+
+def run_segmented_download(segments=SEGMENTS, min_segment_size=MIN_SEGMENT_SIZE, chunk_size=CHUNK_SIZE):
+    uris = schedule_downloads(download_uris, workers=1)
+    with extract_pipeline() as extract_queue:
+        for uri in uris:
+            segmented_download(uri, segments, min_segment_size, chunk_size, extract_queue,
+                               probe=preflight_probes.get(uri))
+
+
 #--------- ASYNC Download ------------
-async def async_download(session, uri):
-    file_name = uri.split('/')[-1][:-4]
+async def async_download(session, uri, chunk_size=CHUNK_SIZE, extract_queue=None, attempt=1):
+    import asyncio
+    import aiohttp
+    import aiofiles
+    file_name = get_file_name(uri)
     path = os.path.join(DOWNLOAD_DIR, file_name)
+    part_path = path + '.part'
+    telemetry.started(uri)
     try:
-        async with session.get(uri) as resp:
+        offset, headers = request_headers(uri, part_path)
+        request_start = time.perf_counter()
+        async with session.get(uri, headers=headers) as resp:
+            body_start = time.perf_counter()
+            telemetry.first_byte(uri, body_start - request_start)
+            if resp.status == 304:
+                logging.info(f"Unchanged, skipped: {uri}")
+                telemetry.finish(uri, 'unchanged')
+                return 0
+            if resp.status == 416:
+                os.remove(part_path)
+                return await async_download(session, uri, chunk_size, extract_queue, attempt)
             resp.raise_for_status()
-            async with aiofiles.open(path, 'wb') as f:
-                await f.write(await resp.read())
-            logging.info(f"Downloaded {path} ")
-            extract_zip(path)
+            # Manifest writes (file lock, JSON dump) stay off the loop
+            validators = await asyncio.to_thread(start_transfer, uri, resp.status, resp.headers)
+            # A resumed transfer re-hashes the .part prefix; off the loop, since it can be GBs
+            check = await asyncio.to_thread(TransferCheck, resp.status, resp.headers, part_path)
+            async with aiofiles.open(part_path, 'ab' if resp.status == 206 else 'wb') as f:
+                async for chunk in resp.content.iter_chunked(limiter.chunk_size(chunk_size)):
+                    await f.write(chunk)
+                    check.update(chunk)
+                    # Same buckets as the threads; only the wait is a coroutine
+                    delay = limiter.reserve(uri, len(chunk))
+                    if delay:
+                        await asyncio.sleep(delay)
+            validators['sha256'] = check.verify()
+        telemetry.transferred(uri, check.received, time.perf_counter() - body_start)
+        telemetry.update(uri, attempts=attempt)
+        os.replace(part_path, path)
+        validators['size'] = os.path.getsize(path)
+        resumed = f" (resumed at byte {offset})" if resp.status == 206 else ""
+        logging.info(f"Downloaded {path}{resumed}")
+        if await asyncio.to_thread(reuse_duplicate, uri, path, validators):
+            return validators['size'] - offset
+        if extract_queue is None:
+            await asyncio.to_thread(process_and_record, uri, path, validators)
+        else:
+            await extract_queue.put((uri, path, validators))
+        return validators['size'] - offset
+    except (CorruptTransfer, aiohttp.ClientPayloadError) as e:
+        if retry_transfer(uri, part_path, e, attempt):
+            return await async_download(session, uri, chunk_size, extract_queue, attempt + 1)
+        telemetry.finish(uri, 'failed', attempts=attempt, error=str(e))
+        return AdaptiveConcurrency.failure_result(e)
     except Exception as e:
         logging.error(f"Async Download failed for {uri}: {e}")
+        result = AdaptiveConcurrency.failure_result(e)
+        telemetry.finish(uri, 'dead' if result == 0 else 'failed', attempts=attempt, error=str(e))
+        return result
+
+
+async def async_limited_download(controller, session, uri, chunk_size=CHUNK_SIZE, extract_queue=None):
+    await controller.acquire_async()
+    nbytes = None
+    try:
+        nbytes = await async_download(session, uri, chunk_size, extract_queue)
+    finally:
+        await controller.release_async(nbytes or 0, nbytes is not None)
         
 
-async def async_run_download():
-    async with aiohttp.ClientSession() as session:
-        tasks = [async_download(session, uri) for uri in download_uris]
-        await asyncio.gather(*tasks)
+async def async_run_download(chunk_size=CHUNK_SIZE, controller=None):
+    import asyncio
+    controller = controller or AdaptiveConcurrency()
+    extract_queue = asyncio.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+    extractor = asyncio.create_task(async_extract_stage(extract_queue))
+    try:
+        async with make_client_session() as session:
+            uris = await async_schedule_downloads(session, download_uris, controller.limit)
+            tasks = [async_limited_download(controller, session, uri, chunk_size, extract_queue)
+                     for uri in uris]
+            await asyncio.gather(*tasks)
+    finally:
+        await extract_queue.put(None)
+        await extractor
         
 
 #--------- Threaded Download ------------
-def run_threaded_download():
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(sync_download, download_uris)
+def limited_download(controller, uri, chunk_size=CHUNK_SIZE, extract_queue=None):
+    controller.acquire()
+    nbytes = None
+    try:
+        nbytes = sync_download(uri, chunk_size, extract_queue)
+    finally:
+        controller.release(nbytes or 0, nbytes is not None)
+    return nbytes
+
+
+def run_threaded_download(chunk_size=CHUNK_SIZE, controller=None):
+    # The pool is sized for the controller's ceiling; the controller decides how
+    # many of those threads are actually downloading at any moment.
+    controller = controller or AdaptiveConcurrency()
+    uris = schedule_downloads(download_uris, controller.limit)
+    with extract_pipeline() as extract_queue:
+        with ThreadPoolExecutor(max_workers=controller.maximum) as executor:
+            executor.map(partial(limited_download, controller, chunk_size=chunk_size, extract_queue=extract_queue),
+                         uris)
     
 
-def main():
-    mode = input("Enter mode (sync / async / threaded):\n").strip().lower()
+MODES = ('sync', 'async', 'threaded', 'segmented')
 
-    if mode == 'sync':
-        for uri in download_uris:
-            sync_download(uri)
-    elif mode == 'async':
-        asyncio.run(async_run_download())
-    elif mode == 'threaded':
-        run_threaded_download()
-    else:
-        logging.warning("Invalid mode selected. Choose from sync, async or threaded.")
-        
-        
+
+#--------- Job Table Workers ------------
+# 'worker' mode: any number of processes or containers share download_uris through
+# a SQLite job table (jobs.py) instead of each downloading the whole list. It is not
+# in MODES because a single worker run isn't comparable with the other modes.
+JOB_POLL_S = 5
+# Telemetry outcome -> job state; anything else (failed, extract_failed) is retried
+JOB_STATES = {'ok': 'done', 'unchanged': 'done', 'duplicate': 'done', 'dead': 'failed'}
+
+
+def job_loop(table, worker, chunk_size=CHUNK_SIZE, extract_queue=None):
+    # Claims and downloads until the table is drained. While other workers still hold
+    # running jobs it keeps polling, so a job whose worker dies is picked up once its
+    # lease runs out.
+    while True:
+        uri = table.claim(worker)
+        if uri is not None:
+            sync_download(uri, chunk_size, extract_queue)
+        elif table.counts().get('running'):
+            time.sleep(JOB_POLL_S)
+        else:
+            return
+
+
+def run_job_worker(job_db, threads=1, chunk_size=CHUNK_SIZE):
+    import jobs
+    table = jobs.JobTable(job_db)
+    worker = jobs.worker_name()
+    if table.add(download_uris):
+        logging.info(f"Previous run in {job_db} was finished; starting a new one")
+
+    # A job is only done once its archive is extracted, so results are marked from
+    # the telemetry record, which is finished at the end of either stage
+    def mark(record):
+        table.finish(record['uri'], worker, JOB_STATES.get(record['outcome'], 'retry'),
+                     {name: record.get(name) for name in ('outcome', 'bytes', 'error')})
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(table.lease_s / 4):
+            table.heartbeat(worker)
+
+    telemetry.listeners.append(mark)
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    logging.info(f"Worker {worker} started with {threads} thread(s) on {job_db}")
+    try:
+        with extract_pipeline() as extract_queue:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                loops = [executor.submit(job_loop, table, worker, chunk_size, extract_queue)
+                         for _ in range(threads)]
+                for loop in loops:
+                    loop.result()
+    finally:
+        stop.set()
+        beat.join()
+        telemetry.listeners.remove(mark)
+    logging.info(f"Worker {worker} finished; jobs by state: {table.counts()}")
+
+
+#--------- Setup ------------
+def configure(download_dir=None, log_dir=None):
+    # Everything this module used to do at import time: create the output and log
+    # directories, start queued logging and load the output directory's manifest.
+    # Runs once; run_mode() calls it with the defaults if nobody has yet.
+    global DOWNLOAD_DIR, LOG_DIR, MANIFEST_PATH, manifest, timestamp
+    if timestamp is not None:
+        return
+    DOWNLOAD_DIR = download_dir or DOWNLOAD_DIR
+    LOG_DIR = log_dir or LOG_DIR
+    MANIFEST_PATH = os.path.join(DOWNLOAD_DIR, "manifest.json")
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime('%d-%m-%Y_%H-%M-%S')
+    log_file_name = os.path.join(LOG_DIR, f"log_file_{timestamp}")
+    # One JSON line per file plus a run summary (see telemetry.py)
+    telemetry_file_name = os.path.join(LOG_DIR, f"telemetry_{timestamp}.jsonl")
+    # Log calls only enqueue; a listener thread writes the files
+    setup_queue_logging(log_file_name, telemetry_file_name)
+    with manifest_lock:
+        manifest = load_manifest()
+    if RATE_LIMIT_MB_S or HOST_RATE_LIMIT_MB_S:
+        limiter.set_rate(RATE_LIMIT_MB_S and RATE_LIMIT_MB_S * MB, HOST_RATE_LIMIT_MB_S and HOST_RATE_LIMIT_MB_S * MB)
+        logging.info(f"Bandwidth caps: {RATE_LIMIT_MB_S} MB/s total, {HOST_RATE_LIMIT_MB_S} MB/s per host")
+
+
+def read_uri_file(path):
+    # One URI per line; blank lines and lines starting with '#' are skipped
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def run_mode(mode, concurrency=None, job_db=None):
+    # Returns False for an unknown mode. Ends with the run summary telemetry record.
+    # concurrency pins the number of simultaneous downloads in the async and threaded
+    # modes, and is the thread count in worker mode; without it the adaptive
+    # controller picks. job_db defaults to jobs.db in the output directory.
+    if mode not in MODES + ('worker',):
+        return False
+    configure()
+    controller = AdaptiveConcurrency(concurrency, concurrency, concurrency) if concurrency else None
+    # Workers only learn their URIs as they claim them
+    telemetry.start_run(mode, download_uris if mode != 'worker' else [])
+    with profiled(PROFILE, os.path.join(LOG_DIR, f"profile_{mode}_{timestamp}")):
+        if mode == 'sync':
+            run_sync_download()
+        elif mode == 'async':
+            import asyncio
+            asyncio.run(async_run_download(controller=controller))
+        elif mode == 'threaded':
+            run_threaded_download(controller=controller)
+        elif mode == 'segmented':
+            run_segmented_download()
+        elif mode == 'worker':
+            run_job_worker(job_db or os.path.join(DOWNLOAD_DIR, "jobs.db"), threads=concurrency or 1)
+    telemetry.summary(peak_rss_mb=peak_rss_mb(), **report_schedule(telemetry.finished_records()))
+    # Left to a single run; parallel workers would race on the totals
+    if AGGREGATE_DIR and mode != 'worker':
+        import aggregates
+        updated = aggregates.update_aggregates(PARQUET_DIR or DOWNLOAD_DIR, AGGREGATE_DIR)
+        logging.info(f"Trip aggregates updated for: {', '.join(updated) or 'nothing new'}")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download and extract the Divvy trip archives.")
+    parser.add_argument('mode', nargs='?', choices=MODES + ('worker',),
+                        help="download mode, or 'worker' to share the list with other workers through "
+                             "--job-db; asked for interactively when omitted on a terminal")
+    parser.add_argument('--concurrency', type=int,
+                        help="fixed number of simultaneous downloads (async/threaded/worker); adaptive if omitted")
+    parser.add_argument('--output-dir', default=DOWNLOAD_DIR, help="where archives are extracted")
+    parser.add_argument('--log-dir', default=LOG_DIR)
+    parser.add_argument('--uri-file', help="file with one URI per line, instead of the built-in list")
+    parser.add_argument('--no-preflight', action='store_true',
+                        help="skip the HEAD probes and download in list order")
+    parser.add_argument('--job-db', help="worker mode job table; defaults to jobs.db in --output-dir")
+    parser.add_argument('--rate-limit', type=float, default=RATE_LIMIT_MB_S, metavar='MB_S',
+                        help="cap on total download bandwidth in MB/s")
+    parser.add_argument('--host-rate-limit', type=float, default=HOST_RATE_LIMIT_MB_S, metavar='MB_S',
+                        help="cap on download bandwidth per host in MB/s")
+    parser.add_argument('--rate-file', help="JSON file with rate_mb_s / per_host_rate_mb_s, "
+                                            "re-read whenever it changes during the run")
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.mode is None:
+        if not sys.stdin.isatty():
+            parser.error("mode is required when not running on a terminal")
+        args.mode = input(f"Enter mode ({' / '.join(MODES)}):\n").strip().lower()
+    return args
+
+
+def main(argv=None):
+    # python3 main.py threaded --concurrency 8 --output-dir /data --uri-file uris.txt
+    global download_uris, PREFLIGHT, RATE_LIMIT_MB_S, HOST_RATE_LIMIT_MB_S
+    args = parse_args(argv)
+    RATE_LIMIT_MB_S, HOST_RATE_LIMIT_MB_S = args.rate_limit, args.host_rate_limit
+    configure(args.output_dir, args.log_dir)
+    if args.rate_file:
+        watch_rate_file(limiter, args.rate_file)
+    PREFLIGHT = not args.no_preflight
+    if args.uri_file:
+        download_uris = read_uri_file(args.uri_file)
+
+    if not run_mode(args.mode, args.concurrency, args.job_db):
+        logging.warning("Invalid mode selected. Choose from sync, async, threaded or segmented.")
+        return 2
+
+    peak = peak_rss_mb()
+    if peak is not None:
+        logging.info(f"Peak RSS ({args.mode}): {peak:.1f} MB")
+    return 0
+
+
+# To run unit tests manually, replace main() below with: import unittest; unittest.main()
 if __name__ == "__main__":
-    main()
-    # Uncomment the next line to run unit tests manually
-    # unittest.main()
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; there only threads are serialised
+    fcntl = None
+
+# Small JSON files that several processes update: the download manifest,
+# schedule.json and the Parquet _manifest.json, when job workers share an output
+# directory. update_json() does the read-modify-write under an exclusive lock on
+# <path>.lock, so each writer merges its change into whatever is on disk now
+# instead of overwriting it with its own stale copy.
+#
+#   update_json('Downloaded_files/schedule.json', lambda rates: rates.update(threaded=4.2))
+
+# flock serialises threads too (each open() is its own lock holder), but the
+# Windows fallback needs this
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_json(path, default=dict):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default()
+
+
+def write_json(path, data):
+    # Write-then-rename so a reader never sees half a file; the temp name is per
+    # process so writers never share one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def update_json(path, update, default=dict):
+    # Calls update(data) on the file's current contents, which it changes in place,
+    # and writes the result back, all under the lock. Returns the data written.
+    with file_lock(path):
+        data = read_json(path, default)
+        update(data)
+        write_json(path, data)
+        return data
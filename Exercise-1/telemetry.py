@@ -0,0 +1,241 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import traceback
+import multiprocessing
+import logging.handlers
+from collections import Counter
+from contextlib import contextmanager
+
+# Structured per-file performance records for the download modes in main.py.
+# Every file gets one JSON line (queue wait, time to first byte, transfer time,
+# bytes, MB/s, extract time, outcome) when it is finished, and every run ends with a
+# summary line. Records go through the same logging queue as the text log, so
+# nothing on the download path, the event loop included, waits on a file write.
+
+TELEMETRY_LOGGER = 'telemetry'
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+#--------- Logging ------------
+def setup_queue_logging(log_file, telemetry_file, level=logging.INFO):
+    # Callers only ever put records on an in-memory queue; one listener thread does
+    # the formatting and the file/console writes. Telemetry records are routed to
+    # telemetry_file as bare JSON lines, everything else to log_file and stderr.
+    def is_telemetry(record):
+        return record.name == TELEMETRY_LOGGER
+
+    text_handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in text_handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(lambda record: not is_telemetry(record))
+    telemetry_handler = logging.FileHandler(telemetry_file)
+    telemetry_handler.setFormatter(logging.Formatter('%(message)s'))
+    telemetry_handler.addFilter(is_telemetry)
+
+    global worker_log_queue
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *text_handlers, telemetry_handler)
+    # Process pool workers can't reach the in-memory queue, so they get their own
+    # cross-process queue, drained by a second listener into the same handlers
+    worker_log_queue = multiprocessing.Queue()
+    worker_listener = logging.handlers.QueueListener(worker_log_queue, *text_handlers, telemetry_handler)
+    # The queue handler only merges msg % args; the listener's handlers do the real formatting
+    logging.basicConfig(level=level, format='%(message)s', handlers=[logging.handlers.QueueHandler(log_queue)],
+                        force=True)
+    listener.start()
+    worker_listener.start()
+    atexit.register(listener.stop)
+    atexit.register(worker_listener.stop)
+    return listener
+
+
+# Set by setup_queue_logging(); None until logging is configured
+worker_log_queue = None
+
+
+def init_worker_logging(log_queue, level):
+    # ProcessPoolExecutor initializer. A forked worker inherits the parent's queue
+    # handler, but nothing drains that copy of the queue, so its records would be lost.
+    if log_queue is not None:
+        logging.basicConfig(level=level, format='%(message)s',
+                            handlers=[logging.handlers.QueueHandler(log_queue)], force=True)
+
+
+def worker_pool_logging():
+    # ProcessPoolExecutor(..., **worker_pool_logging()) makes the workers log to this run's log
+    return {'initializer': init_worker_logging, 'initargs': (worker_log_queue, logging.getLogger().level)}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+#--------- Per-file Records ------------
+class Telemetry:
+    # Builds one record per URI across the download and extraction stages, which
+    # run on different threads, and emits it on finish(). Timings are seconds.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(TELEMETRY_LOGGER)
+        self.mode = None
+        self.run_started = None
+        self.records = {}
+        self.finished = []
+        # Called with each finished record, outside the lock
+        self.listeners = []
+
+    def start_run(self, mode, uris):
+        now = time.perf_counter()
+        with self.lock:
+            self.mode = mode
+            self.run_started = now
+            self.finished = []
+            self.records = {uri: {'uri': uri, 'queued': now} for uri in uris}
+
+    def _record(self, uri):
+        return self.records.setdefault(uri, {'uri': uri, 'queued': time.perf_counter()})
+
+    def started(self, uri):
+        # First call per file wins, so retries and fallbacks don't reset the clock
+        with self.lock:
+            record = self._record(uri)
+            if 'started' not in record:
+                record['started'] = time.perf_counter()
+                record['queue_wait_s'] = record['started'] - record['queued']
+
+    def elapsed(self):
+        # Seconds since start_run
+        return time.perf_counter() - self.run_started if self.run_started else 0.0
+
+    def first_byte(self, uri, ttfb):
+        with self.lock:
+            self._record(uri).setdefault('ttfb_s', ttfb)
+
+    def update(self, uri, **fields):
+        with self.lock:
+            self._record(uri).update(fields)
+
+    def transferred(self, uri, nbytes, seconds):
+        with self.lock:
+            record = self._record(uri)
+            record['bytes'] = nbytes
+            record['transfer_s'] = seconds
+            record['mb_s'] = nbytes / 1024 / 1024 / seconds if seconds else None
+            record['downloaded_s'] = self.elapsed()
+
+    def finish(self, uri, outcome, **fields):
+        with self.lock:
+            record = self.records.pop(uri, None) or {'uri': uri, 'queued': time.perf_counter()}
+            record.update(fields)
+            record['outcome'] = outcome
+            record['total_s'] = time.perf_counter() - record.pop('queued')
+            record.pop('started', None)
+            record['mode'] = self.mode
+            self.finished.append(record)
+        self.logger.info(json.dumps({'type': 'file', **record}, default=str))
+        for listener in list(self.listeners):
+            listener(record)
+
+    def finished_records(self):
+        with self.lock:
+            return list(self.finished)
+
+    def summary(self, **fields):
+        # Run-level totals; anything never finished (e.g. an unknown mode) counts as 'unfinished'
+        with self.lock:
+            records = list(self.finished)
+            unfinished = len(self.records)
+            wall = time.perf_counter() - self.run_started if self.run_started else None
+
+        def column(name):
+            return [record[name] for record in records if record.get(name) is not None]
+
+        total_bytes = sum(column('bytes'))
+        summary = {
+            'type': 'summary', 'mode': self.mode, 'wall_s': wall, 'files': len(records),
+            'unfinished': unfinished, 'outcomes': dict(Counter(record['outcome'] for record in records)),
+            'bytes': total_bytes,
+            'mb_s': total_bytes / 1024 / 1024 / wall if wall else None,
+        }
+        for name in ('queue_wait_s', 'ttfb_s', 'transfer_s', 'extract_s'):
+            values = column(name)
+            summary[name] = {'p50': percentile(values, 50), 'p90': percentile(values, 90),
+                             'max': max(values) if values else None}
+        summary.update(fields)
+        self.logger.info(json.dumps(summary, default=str))
+        return summary
+
+
+#--------- Profiling ------------
+class SamplingProfiler:
+    # Samples every thread's stack each interval and counts them as folded stacks
+    # ("outer;inner;leaf count" lines, the input flamegraph.pl and speedscope take).
+    # Unlike cProfile it sees the download threads, not just the main thread.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = traceback.extract_stack(frame)
+                self.counts[';'.join(f"{entry.name} ({entry.filename}:{entry.lineno})" for entry in stack)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(kind, path_prefix):
+    # kind is None (off), 'cprofile' (<prefix>.prof plus a top-30 <prefix>.txt) or
+    # 'sample' (<prefix>.folded)
+    if kind is None:
+        yield
+        return
+    if kind == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{path_prefix}.prof")
+            with open(f"{path_prefix}.txt", 'w') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(30)
+            logging.info(f"cProfile output written to {path_prefix}.prof")
+    elif kind == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            profiler.write(f"{path_prefix}.folded")
+            logging.info(f"Sampled stacks written to {path_prefix}.folded")
+    else:
+        raise ValueError(f"Unknown profiler: {kind}")
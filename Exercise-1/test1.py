@@ -1,5 +1,6 @@
 import requests
 import os
+import hashlib
 import zipfile
 
 download_uris = [
@@ -12,6 +13,10 @@ download_uris = [
     "https://divvy-tripdata.s3.amazonaws.com/Divvy_Trips_2220_Q1.zip",
 ]
 
+CHUNK_SIZE = 1024 * 1024
+# A body that doesn't match its Content-Length is fetched again up to this many times in all
+DOWNLOAD_ATTEMPTS = 3
+
 DOWNLOAD_DIR = os.path.join("downloaded_files")
 
 def ensure_directory():
@@ -22,14 +27,26 @@ def get_file_name(uri):
     ## Extract Filename from uri
     return uri.split('/')[-1][:-4]
 
-def download_zip(uri, dest_path):
-    ## Download a file and save it to disk.
+def download_zip(uri, dest_path, chunk_size=CHUNK_SIZE, attempt=1):
+    ## Stream a file to disk in fixed-size chunks, hashing and counting them as they arrive.
     try:
-        response = requests.get(uri)
-        response.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            f.write(response.content)
-        print(f"File Downloaded: {dest_path}")
+        with requests.get(uri, stream=True) as response:
+            response.raise_for_status()
+            sha256 = hashlib.sha256()
+            received = 0
+            with open(dest_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    received += len(chunk)
+        expected = response.headers.get('Content-Length')
+        if expected is not None and int(expected) != received:
+            if attempt < DOWNLOAD_ATTEMPTS:
+                print(f"Got {received} of {expected} bytes, retrying: {uri}")
+                return download_zip(uri, dest_path, chunk_size, attempt + 1)
+            print(f"Incomplete download: {uri}")
+            return False
+        print(f"File Downloaded: {dest_path} (sha256 {sha256.hexdigest()})")
         return True
     except requests.exceptions.HTTPError as http_error:
         print(f"HTTP Error: {http_error}\n")
@@ -1,7 +1,11 @@
 import requests
 import os
+import hashlib
 import zipfile
+import queue
+import atexit
 import logging as log
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 
 download_uris = [
@@ -15,6 +19,10 @@ download_uris = [
 ]
 
 
+CHUNK_SIZE = 1024 * 1024
+# A body that doesn't match its Content-Length is fetched again up to this many times in all
+DOWNLOAD_ATTEMPTS = 3
+
 DOWNLOAD_DIR = os.path.join("downloads")
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -24,15 +32,15 @@ timestamp = datetime.now().strftime('%d-%m-%Y_%H-%M-%S')
 log_file_name  = os.path.join(LOG_DIR,f"log_file_{timestamp}.log")
 
 
-# Logging configuration
-log.basicConfig(
-    level=log.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        log.FileHandler(log_file_name),
-        log.StreamHandler()
-    ]
-)
+# Logging configuration: log calls only enqueue records, a listener thread writes them
+log_queue = queue.SimpleQueue()
+log_handlers = [log.FileHandler(log_file_name), log.StreamHandler()]
+for handler in log_handlers:
+    handler.setFormatter(log.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+log_listener = QueueListener(log_queue, *log_handlers)
+log.basicConfig(level=log.INFO, format="%(message)s", handlers=[QueueHandler(log_queue)])
+log_listener.start()
+atexit.register(log_listener.stop)
 
 def ensure_directory():
     ##Create the download directory if it doesn't exist  
@@ -45,14 +53,26 @@ def get_file_name(uri):
     return uri.split('/')[-1][:-4]
 
 
-def download_zip(uri, dest_path):
-    ## Download a file and save it to disk.
+def download_zip(uri, dest_path, chunk_size=CHUNK_SIZE, attempt=1):
+    ## Stream a file to disk in fixed-size chunks, hashing and counting them as they arrive.
     try:
-        response = requests.get(uri)
-        response.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            f.write(response.content)
-        log.info(f"Downloaded: {dest_path}")
+        with requests.get(uri, stream=True) as response:
+            response.raise_for_status()
+            sha256 = hashlib.sha256()
+            received = 0
+            with open(dest_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    received += len(chunk)
+        expected = response.headers.get('Content-Length')
+        if expected is not None and int(expected) != received:
+            if attempt < DOWNLOAD_ATTEMPTS:
+                log.warning(f"Got {received} of {expected} bytes, retrying: {uri}")
+                return download_zip(uri, dest_path, chunk_size, attempt + 1)
+            log.error(f"Incomplete download: {uri}")
+            return False
+        log.info(f"Downloaded: {dest_path} (sha256 {sha256.hexdigest()})")
         return True
     except requests.exceptions.HTTPError as http_error:
         log.error(f"HTTP Error: {uri} -> {http_error}")
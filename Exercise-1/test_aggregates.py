@@ -0,0 +1,131 @@
+import os
+import csv
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+import aggregates
+import trips
+
+# Three tiny quarters, one per header layout the Divvy files have used. Rows are
+# (start, duration in seconds, start station, user type as written in the file).
+LAYOUTS = {
+    'Divvy_Trips_2019_Q1.csv': ['trip_id', 'start_time', 'end_time', 'bikeid', 'tripduration', 'from_station_id',
+                                'from_station_name', 'to_station_id', 'to_station_name', 'usertype', 'gender',
+                                'birthyear'],
+    'Divvy_Trips_2019_Q2.csv': ['01 - Rental Details Rental ID', '01 - Rental Details Local Start Time',
+                                '01 - Rental Details Local End Time', '01 - Rental Details Bike ID',
+                                '01 - Rental Details Duration In Seconds Uncapped', '03 - Rental Start Station ID',
+                                '03 - Rental Start Station Name', '02 - Rental End Station ID',
+                                '02 - Rental End Station Name', 'User Type', 'Member Gender',
+                                '05 - Member Details Member Birthday Year'],
+    # No duration column; it comes from end minus start
+    'Divvy_Trips_2020_Q1.csv': ['ride_id', 'started_at', 'ended_at', 'start_station_id', 'start_station_name',
+                                'end_station_id', 'end_station_name', 'member_casual'],
+}
+ROWS = {
+    'Divvy_Trips_2019_Q1.csv': [('2019-01-01 00:04:37', 390, 199, 'Subscriber'),
+                                ('2019-01-01 08:10:00', 1450, 199, 'Customer'),
+                                ('2019-01-02 12:00:00', 0, 44, 'Subscriber')],
+    'Divvy_Trips_2019_Q2.csv': [('2019-04-01 00:02:22', 446, 199, 'Subscriber'),
+                                ('2019-04-01 09:30:00', 12000, 81, 'Customer')],
+    'Divvy_Trips_2020_Q1.csv': [('2020-01-21 20:06:59', 388, 239, 'member'),
+                                ('2020-01-21 21:00:00', 90, 199, 'casual'),
+                                ('2020-01-30 07:15:00', 3600, 239, 'member')],
+}
+
+
+def write_quarter(directory, name, rows):
+    header = LAYOUTS[name]
+    path = os.path.join(directory, name)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for number, (start, duration, station, user_type) in enumerate(rows):
+            started = datetime.fromisoformat(start)
+            ended = (started + timedelta(seconds=duration)).isoformat(sep=' ')
+            if name.startswith('Divvy_Trips_2020'):
+                writer.writerow([f"R{number}", start, ended, station, 'A', 1, 'B', user_type])
+            else:
+                # Durations carry thousands separators, as in the real files
+                writer.writerow([number, start, ended, 7, f"{duration:,}.0", station, 'A', 1, 'B', user_type,
+                                 'Male', 1985])
+    return path
+
+
+def expected(rows):
+    # The same aggregate computed row by row, without pyarrow
+    station_day = Counter((station, datetime.fromisoformat(start).date()) for start, _, station, _ in rows)
+    duration_bins = Counter(math.floor(math.log10(max(duration, 1.0)) * aggregates.BINS_PER_DECADE)
+                            for _, duration, _, _ in rows)
+    user_types = Counter(trips.USER_TYPES.get(user_type, user_type) for _, _, _, user_type in rows)
+    return station_day, duration_bins, user_types
+
+
+def assert_matches(aggregate, rows):
+    station_day, duration_bins, user_types = expected(rows)
+    got = Counter({(row['from_station_id'], row['day']): row['trips']
+                   for row in aggregate.station_day.to_pylist()})
+    assert got == station_day
+    assert aggregate.duration_bins == duration_bins
+    assert aggregate.user_types == user_types
+    assert aggregate.rows == len(rows)
+
+
+def make_parquet_cache(tmp_path):
+    csv_dir, parquet_dir = tmp_path / 'csv', tmp_path / 'parquet'
+    csv_dir.mkdir()
+    for name, rows in ROWS.items():
+        trips.convert_csv(write_quarter(str(csv_dir), name, rows), str(parquet_dir))
+    return str(csv_dir), str(parquet_dir)
+
+
+def test_each_layout_aggregates_its_rows(tmp_path):
+    for name, rows in ROWS.items():
+        assert_matches(aggregates.aggregate_quarter(write_quarter(str(tmp_path), name, rows)), rows)
+
+
+def test_merged_quarters_equal_aggregating_their_rows(tmp_path):
+    parts = [aggregates.aggregate_quarter(write_quarter(str(tmp_path), name, rows)) for name, rows in ROWS.items()]
+    merged = aggregates.TripAggregate().merge(*parts)
+    assert_matches(merged, [row for rows in ROWS.values() for row in rows])
+    assert sorted(merged.sources) == ['2019_Q1', '2019_Q2', '2020_Q1']
+
+
+def test_update_skips_unchanged_quarters_and_rerolls_after_a_change(tmp_path):
+    csv_dir, parquet_dir = make_parquet_cache(tmp_path)
+    agg_dir = str(tmp_path / 'aggregates')
+    assert aggregates.update_aggregates(parquet_dir, agg_dir) == ['2019_Q1', '2019_Q2', '2020_Q1']
+    assert aggregates.update_aggregates(parquet_dir, agg_dir) == []
+
+    # 2019_Q2 is republished with one more trip
+    rows = ROWS['Divvy_Trips_2019_Q2.csv'] + [('2019-05-05 10:00:00', 600, 81, 'Subscriber')]
+    trips.convert_csv(write_quarter(csv_dir, 'Divvy_Trips_2019_Q2.csv', rows), parquet_dir)
+    assert aggregates.update_aggregates(parquet_dir, agg_dir) == ['2019_Q2']
+
+    all_rows = ROWS['Divvy_Trips_2019_Q1.csv'] + rows + ROWS['Divvy_Trips_2020_Q1.csv']
+    assert_matches(aggregates.load_totals(agg_dir), all_rows)
+
+
+def test_new_quarter_is_added_to_the_totals(tmp_path):
+    csv_dir, parquet_dir = tmp_path / 'csv', str(tmp_path / 'parquet')
+    csv_dir.mkdir()
+    agg_dir = str(tmp_path / 'aggregates')
+    first, second = 'Divvy_Trips_2019_Q1.csv', 'Divvy_Trips_2020_Q1.csv'
+    trips.convert_csv(write_quarter(str(csv_dir), first, ROWS[first]), parquet_dir)
+    aggregates.update_aggregates(parquet_dir, agg_dir)
+    trips.convert_csv(write_quarter(str(csv_dir), second, ROWS[second]), parquet_dir)
+    assert aggregates.update_aggregates(parquet_dir, agg_dir) == ['2020_Q1']
+    assert_matches(aggregates.load_totals(agg_dir), ROWS[first] + ROWS[second])
+
+
+def test_rollup_ranges(tmp_path):
+    _, parquet_dir = make_parquet_cache(tmp_path)
+    agg_dir = str(tmp_path / 'aggregates')
+    aggregates.update_aggregates(parquet_dir, agg_dir)
+
+    assert_matches(aggregates.rollup(agg_dir, years=[2019]),
+                   ROWS['Divvy_Trips_2019_Q1.csv'] + ROWS['Divvy_Trips_2019_Q2.csv'])
+    assert_matches(aggregates.rollup(agg_dir, quarters=[1]),
+                   ROWS['Divvy_Trips_2019_Q1.csv'] + ROWS['Divvy_Trips_2020_Q1.csv'])
+    assert_matches(aggregates.rollup(agg_dir, years=[2020], quarters=[2]), [])
+    assert_matches(aggregates.rollup(agg_dir), [row for rows in ROWS.values() for row in rows])
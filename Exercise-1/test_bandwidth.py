@@ -0,0 +1,135 @@
+import heapq
+import pytest
+import bandwidth
+from bandwidth import TokenBucket, BandwidthLimiter, LIMITED_CHUNK_SIZE
+
+# The buckets only ever read time.monotonic(), so a fake clock makes every
+# reservation delay exact. Rates are bytes per second; BURST_S is 0.1.
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(bandwidth.time, 'monotonic', clock)
+    return clock
+
+
+def stream_bytes(limiter, uris, seconds, chunk=100):
+    # Streams that each read a chunk, pay for it and wait as told, run on the fake
+    # clock until `seconds` have passed. Returns the bytes each stream got.
+    clock = bandwidth.time.monotonic
+    end = clock.now + seconds
+    received = dict.fromkeys(uris, 0)
+    # Ties go to whoever asked first, as they would between real threads
+    turns = [(clock.now, order, uri) for order, uri in enumerate(uris)]
+    asked = len(turns)
+    heapq.heapify(turns)
+    while turns:
+        at, _, uri = heapq.heappop(turns)
+        if at >= end:
+            continue
+        clock.now = at
+        received[uri] += chunk
+        heapq.heappush(turns, (at + limiter.reserve(uri, chunk), asked, uri))
+        asked += 1
+    return received
+
+
+def test_unlimited_never_waits(clock):
+    bucket = TokenBucket()
+    assert bucket.reserve(10 ** 9) == 0.0
+    limiter = BandwidthLimiter()
+    assert not limiter.active
+    assert limiter.reserve('http://a/x.zip', 10 ** 9) == 0.0
+    assert limiter.chunk_size(10 ** 6) == 10 ** 6
+
+
+def test_reservations_queue_behind_each_other(clock):
+    bucket = TokenBucket(rate=1000)
+    # The 100-byte burst is free, after that each 100 bytes is another 0.1 s
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+    assert bucket.reserve(100) == pytest.approx(0.2)
+    # 0.1 s later the queue is 0.1 s shorter
+    clock.advance(0.1)
+    assert bucket.reserve(100) == pytest.approx(0.2)
+    # Idle time refills at most the burst
+    clock.advance(60)
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_cap_holds_and_streams_share_it_evenly(clock):
+    limiter = BandwidthLimiter(rate=10_000)
+    uris = ['http://a/1.zip', 'http://a/2.zip', 'http://b/3.zip']
+    received = stream_bytes(limiter, uris, seconds=10)
+    # 10 s at the rate plus the burst, split three ways to within a chunk
+    assert sum(received.values()) == pytest.approx(10 * 10_000 + 1000, abs=300)
+    assert max(received.values()) - min(received.values()) <= 100
+
+
+def test_per_host_cap_does_not_slow_other_hosts(clock):
+    limiter = BandwidthLimiter(per_host_rate=1000)
+    assert limiter.active
+    assert limiter.chunk_size(10 ** 6) == LIMITED_CHUNK_SIZE
+    received = stream_bytes(limiter, ['http://a/1.zip', 'http://a/2.zip', 'http://b/3.zip'], seconds=10)
+    # Host a's two streams split its cap; host b has one of its own
+    assert received['http://a/1.zip'] + received['http://a/2.zip'] == pytest.approx(10_100, abs=200)
+    assert received['http://b/3.zip'] == pytest.approx(10_100, abs=200)
+
+
+def test_global_and_per_host_wait_for_the_slower(clock):
+    # Per-host cap is the tighter one
+    limiter = BandwidthLimiter(rate=10_000, per_host_rate=1000)
+    limiter.reserve('http://a/1.zip', 100)
+    assert limiter.reserve('http://a/1.zip', 100) == pytest.approx(0.1)
+    # Global cap is the tighter one: its 50-byte burst is gone after half a chunk
+    limiter = BandwidthLimiter(rate=500, per_host_rate=1000)
+    assert limiter.reserve('http://a/1.zip', 100) == pytest.approx(0.1)
+    assert limiter.reserve('http://b/2.zip', 100) == pytest.approx(0.3)
+
+
+def test_enabling_a_cap_at_runtime(clock):
+    bucket = TokenBucket()
+    bucket.reserve(10 ** 6)
+    bucket.set_rate(1000)
+    # Starts with a full burst, not a debt from the unlimited period
+    assert bucket.reserve(100) == 0.0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_disabling_a_cap_at_runtime(clock):
+    limiter = BandwidthLimiter(rate=1000, per_host_rate=1000)
+    limiter.reserve('http://a/1.zip', 10_000)
+    limiter.set_rate(None, None)
+    assert not limiter.active
+    assert limiter.reserve('http://a/1.zip', 10_000) == 0.0
+
+
+def test_changing_the_rate_keeps_the_backlog(clock):
+    bucket = TokenBucket(rate=1000)
+    bucket.reserve(1100)
+    # 1000 bytes owed; at the new rate they take 0.5 s, and the next 100 bytes 0.05 s more
+    bucket.set_rate(2000)
+    assert bucket.reserve(100) == pytest.approx(0.55)
+
+
+def test_changing_the_per_host_rate_applies_to_existing_hosts(clock):
+    limiter = BandwidthLimiter(per_host_rate=1000)
+    limiter.reserve('http://a/1.zip', 100)
+    limiter.set_rate(per_host_rate=100)
+    assert limiter.reserve('http://a/1.zip', 100) == pytest.approx(1.0)
+    # A host first seen after the change starts at the new rate with its burst
+    assert limiter.reserve('http://b/1.zip', 10) == 0.0
+    assert limiter.reserve('http://b/1.zip', 10) == pytest.approx(0.1)
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import main
+import trips
+from jobs import JobTable
+from shared_files import update_json
+from telemetry import setup_queue_logging, worker_pool_logging
+
+# Several worker processes sharing one output directory: the job table must hand each
+# URI to exactly one of them, and the shared JSON files must keep every writer's entries.
+
+WRITERS = 2
+ROUNDS = 40
+
+
+def run_in_processes(target, *args):
+    # spawn, so every writer starts with its own fresh copy of main's module state
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=target, args=(index, *args)) for index in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+def claim_all(index, db_path, out_dir):
+    table = JobTable(db_path)
+    worker = f"worker-{index}"
+    claimed = []
+    while (uri := table.claim(worker)) is not None:
+        claimed.append(uri)
+        table.finish(uri, worker, 'done')
+    with open(os.path.join(out_dir, f"claimed-{index}.json"), 'w') as f:
+        json.dump(claimed, f)
+
+
+def write_manifest_entries(index, out_dir):
+    main.configure(out_dir, os.path.join(out_dir, f"logs-{index}"))
+    for round_ in range(ROUNDS):
+        main.update_manifest(f"https://example.com/worker{index}_{round_}.zip", etag=f'"{index}-{round_}"')
+
+
+def record_parquet_conversions(index, parquet_dir):
+    for round_ in range(ROUNDS):
+        trips.record_conversions(parquet_dir, [{'path': f"year=2019/quarter=1/w{index}_{round_}.parquet",
+                                                'rows': round_}])
+
+
+def bump_counter(index, path):
+    for _ in range(ROUNDS):
+        update_json(path, lambda data: data.update(count=data.get('count', 0) + 1))
+
+
+def log_from_worker(message):
+    logging.warning(message)
+
+
+def test_process_pool_workers_log_to_the_run_log(tmp_path):
+    # A forked worker inherits the parent's in-memory queue handler; without the
+    # pool initializer its records never reach the log file
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    log_file = tmp_path / 'log'
+    setup_queue_logging(str(log_file), str(tmp_path / 'telemetry.jsonl'))
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork'),
+                                 **worker_pool_logging()) as pool:
+            pool.submit(log_from_worker, 'Invalid ZIP file: broken.zip').result()
+    finally:
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+    # The listener thread writes the record shortly after the worker queues it
+    deadline = time.monotonic() + 5
+    while 'broken.zip' not in log_file.read_text() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert 'Invalid ZIP file: broken.zip' in log_file.read_text()
+
+
+def test_job_table_hands_each_uri_to_one_worker(tmp_path):
+    uris = [f"https://example.com/{n}.zip" for n in range(200)]
+    db_path = str(tmp_path / 'jobs.db')
+    JobTable(db_path).add(uris)
+    run_in_processes(claim_all, db_path, str(tmp_path))
+
+    claimed = []
+    for index in range(WRITERS):
+        with open(tmp_path / f"claimed-{index}.json") as f:
+            claimed.extend(json.load(f))
+    assert sorted(claimed) == sorted(uris)
+    assert JobTable(db_path).counts() == {'done': len(uris)}
+
+
+def test_job_table_starts_a_new_run_once_the_last_is_finished(tmp_path):
+    uris = [f"https://example.com/{n}.zip" for n in range(3)]
+    table = JobTable(str(tmp_path / 'jobs.db'))
+    assert not table.add(uris)
+    first = table.claim('a')
+    table.finish(first, 'a', 'done')
+    # Another worker joining the same run leaves finished jobs alone
+    assert not table.add(uris)
+    assert table.counts() == {'done': 1, 'pending': 2}
+
+    for _ in range(2):
+        table.finish(table.claim('a'), 'a', 'failed')
+    assert table.add(uris + ["https://example.com/new.zip"])
+    assert table.counts() == {'pending': 4}
+    assert table.claim('b') == first
+
+
+def test_manifest_writers_keep_each_others_entries(tmp_path):
+    run_in_processes(write_manifest_entries, str(tmp_path))
+    with open(tmp_path / 'manifest.json') as f:
+        saved = json.load(f)
+    assert len(saved) == WRITERS * ROUNDS
+
+
+def test_stale_entry_does_not_overwrite_newer_one(tmp_path, monkeypatch):
+    # Worker A loaded X, worker B then saved a newer X, and A saves an unrelated Y
+    path = str(tmp_path / 'manifest.json')
+    monkeypatch.setattr(main, 'MANIFEST_PATH', path)
+    monkeypatch.setattr(main, 'manifest', {'X': {'etag': '"old"'}})
+    with open(path, 'w') as f:
+        json.dump({'X': {'etag': '"new"', 'sha256': 'abc'}}, f)
+
+    main.update_manifest('Y', etag='"y"')
+
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved == {'X': {'etag': '"new"', 'sha256': 'abc'}, 'Y': {'etag': '"y"'}}
+    assert main.manifest['X']['etag'] == '"new"'
+
+
+def test_parquet_manifest_writers_keep_each_others_entries(tmp_path):
+    run_in_processes(record_parquet_conversions, str(tmp_path))
+    manifest = trips.load_manifest(str(tmp_path))
+    assert len(manifest['files']) == WRITERS * ROUNDS
+
+
+def test_update_json_serialises_writers(tmp_path):
+    path = str(tmp_path / 'schedule.json')
+    run_in_processes(bump_counter, path)
+    with open(path) as f:
+        assert json.load(f) == {'count': WRITERS * ROUNDS}
@@ -0,0 +1,222 @@
+import io
+import os
+import re
+import csv
+import json
+import zipfile
+from functools import partial
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from shared_files import update_json
+
+# Columnar cache for the extracted Divvy trip CSVs.
+# Every quarter is rewritten as typed, compressed Parquet under
+# <parquet_dir>/year=YYYY/quarter=Q/, so later loads read only the columns and
+# partitions they ask for instead of reparsing the CSV text. The source can be an
+# extracted CSV or the CSV member of the downloaded zip, read as a stream so the
+# CSV never has to be written to disk.
+
+# The Divvy files change column names between quarters (2019_Q2 uses
+# "01 - Rental Details ..." headers, 2020 switched to ride_id/started_at/...).
+# Everything is normalised to this one schema; aliases are tried in order.
+TRIP_SCHEMA = pa.schema([
+    ('trip_id', pa.string()),
+    ('start_time', pa.timestamp('s')),
+    ('end_time', pa.timestamp('s')),
+    ('bike_id', pa.int64()),
+    ('duration_sec', pa.float64()),
+    ('from_station_id', pa.int64()),
+    ('from_station_name', pa.string()),
+    ('to_station_id', pa.int64()),
+    ('to_station_name', pa.string()),
+    ('user_type', pa.string()),
+    ('gender', pa.string()),
+    ('birth_year', pa.int32()),
+])
+
+COLUMN_ALIASES = {
+    'trip_id': ['trip_id', '01 - Rental Details Rental ID', 'ride_id'],
+    'start_time': ['start_time', '01 - Rental Details Local Start Time', 'started_at'],
+    'end_time': ['end_time', '01 - Rental Details Local End Time', 'ended_at'],
+    'bike_id': ['bikeid', '01 - Rental Details Bike ID'],
+    'duration_sec': ['tripduration', '01 - Rental Details Duration In Seconds Uncapped'],
+    'from_station_id': ['from_station_id', '03 - Rental Start Station ID', 'start_station_id'],
+    'from_station_name': ['from_station_name', '03 - Rental Start Station Name', 'start_station_name'],
+    'to_station_id': ['to_station_id', '02 - Rental End Station ID', 'end_station_id'],
+    'to_station_name': ['to_station_name', '02 - Rental End Station Name', 'end_station_name'],
+    'user_type': ['usertype', 'User Type', 'member_casual'],
+    'gender': ['gender', 'Member Gender'],
+    'birth_year': ['birthyear', '05 - Member Details Member Birthday Year'],
+}
+
+# 2020 onwards says member/casual where earlier quarters say Subscriber/Customer
+USER_TYPES = {'member': 'Subscriber', 'casual': 'Customer'}
+
+RAW_COLUMNS = [alias for aliases in COLUMN_ALIASES.values() for alias in aliases]
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+MANIFEST_NAME = '_manifest.json'
+
+
+def quarter_of(file_name):
+    # (year, quarter) from names like Divvy_Trips_2019_Q1.csv
+    match = re.search(r'(\d{4})_Q([1-4])', file_name)
+    if match is None:
+        raise ValueError(f"No year/quarter in file name: {file_name}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def read_header(binary_file):
+    return next(csv.reader(io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')))
+
+
+def csv_options(header):
+    # Only the known columns present in this file's header are parsed at all. They
+    # are read as text (tripduration has thousands separators, birthyear is sometimes
+    # "1985.0") and typed in normalize_batch.
+    columns = [name for name in header if name in RAW_COLUMNS]
+    convert_options = pv.ConvertOptions(
+        column_types={name: pa.string() for name in columns},
+        include_columns=columns,
+        strings_can_be_null=True,
+    )
+    return pv.ReadOptions(block_size=CSV_BLOCK_SIZE), convert_options
+
+
+def _to_type(column, field):
+    if field.type == pa.string():
+        return column
+    if field.name == 'duration_sec':
+        return pc.cast(pc.replace_substring(column, ',', ''), pa.float64())
+    if pa.types.is_integer(field.type):
+        return pc.cast(pc.cast(column, pa.float64()), field.type)
+    return pc.cast(column, field.type)
+
+
+def normalize_batch(batch):
+    # One raw CSV batch, whatever quarter it came from, as a TRIP_SCHEMA batch
+    present = set(batch.schema.names)
+    columns = {}
+    for field in TRIP_SCHEMA:
+        alias = next((alias for alias in COLUMN_ALIASES[field.name] if alias in present), None)
+        if alias is None:
+            columns[field.name] = pa.nulls(batch.num_rows, field.type)
+        else:
+            columns[field.name] = _to_type(batch.column(alias), field)
+
+    if columns['duration_sec'].null_count == batch.num_rows:
+        elapsed = pc.subtract(columns['end_time'], columns['start_time'])
+        columns['duration_sec'] = pc.cast(pc.cast(elapsed, pa.int64()), pa.float64())
+    user_types = columns['user_type']
+    for raw, normalized in USER_TYPES.items():
+        user_types = pc.if_else(pc.equal(user_types, raw), normalized, user_types)
+    columns['user_type'] = user_types
+    return pa.RecordBatch.from_arrays([columns[field.name] for field in TRIP_SCHEMA], schema=TRIP_SCHEMA)
+
+
+def partition_path(parquet_dir, file_name):
+    year, quarter = quarter_of(file_name)
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return os.path.join(parquet_dir, f"year={year}", f"quarter={quarter}", f"{stem}.parquet")
+
+
+def read_batches(open_source):
+    # Normalised record batches from a CSV. open_source() must return a fresh binary
+    # file object each call: one pass reads the header, the second streams the rows.
+    with open_source() as f:
+        header = read_header(f)
+    read_options, convert_options = csv_options(header)
+    with open_source() as f:
+        for batch in pv.open_csv(f, read_options=read_options, convert_options=convert_options):
+            yield normalize_batch(batch)
+
+
+def write_batches(batches, out_path, compression='zstd'):
+    # Streams batches into out_path via a temp file; returns the row count
+    # The dot prefix keeps half-written files out of dataset scans
+    out_dir, out_name = os.path.split(out_path)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, f".{out_name}.tmp")
+    rows = 0
+    with pq.ParquetWriter(tmp_path, TRIP_SCHEMA, compression=compression) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    os.replace(tmp_path, out_path)
+    return rows
+
+
+def conversion_info(source, out_path, parquet_dir, rows):
+    year, quarter = quarter_of(source)
+    return {'source': os.path.basename(source), 'path': os.path.relpath(out_path, parquet_dir),
+            'year': year, 'quarter': quarter, 'rows': rows}
+
+
+def convert_csv(csv_path, parquet_dir):
+    # One extracted quarter CSV to Parquet. Returns the info record_conversions stores.
+    out_path = partition_path(parquet_dir, csv_path)
+    rows = write_batches(read_batches(partial(open, csv_path, 'rb')), out_path)
+    return conversion_info(csv_path, out_path, parquet_dir, rows)
+
+
+def csv_members(zip_ref):
+    return [name for name in zip_ref.namelist()
+            if name.endswith('.csv') and not name.startswith('__MACOSX')]
+
+
+def convert_zip(zip_path, parquet_dir):
+    # Every CSV member of a downloaded archive straight to Parquet, decompressed and
+    # parsed as a stream. Returns one info dict per member.
+    infos = []
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        for member in csv_members(zip_ref):
+            out_path = partition_path(parquet_dir, member)
+            rows = write_batches(read_batches(partial(zip_ref.open, member)), out_path)
+            infos.append(conversion_info(member, out_path, parquet_dir, rows))
+    return infos
+
+
+def read_zip_table(zip_path):
+    # Same stream, collected into an in-memory Table instead of a file
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        batches = [batch for member in csv_members(zip_ref)
+                   for batch in read_batches(partial(zip_ref.open, member))]
+    return pa.Table.from_batches(batches, schema=TRIP_SCHEMA)
+
+
+#--------- Manifest ------------
+def load_manifest(parquet_dir):
+    try:
+        with open(os.path.join(parquet_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'schema': {}, 'files': {}}
+
+
+def record_conversions(parquet_dir, infos):
+    # Job workers may share parquet_dir, so the entries are merged into the file
+    # under a cross-process lock rather than written from a copy loaded earlier
+    def merge(manifest):
+        manifest['schema'] = {field.name: str(field.type) for field in TRIP_SCHEMA}
+        manifest.setdefault('files', {})
+        for info in infos:
+            manifest['files'][info['path']] = info
+
+    os.makedirs(parquet_dir, exist_ok=True)
+    update_json(os.path.join(parquet_dir, MANIFEST_NAME), merge, default=lambda: {'schema': {}, 'files': {}})
+
+
+#--------- Loading ------------
+def load_trips(parquet_dir, columns=None, years=None, quarters=None, filter=None):
+    # Reads only the requested columns from the matching year/quarter partitions.
+    # Returns a pyarrow Table; call .to_pandas() for a DataFrame.
+    # _manifest.json is skipped by the dataset's default ignore_prefixes ('_', '.')
+    dataset = ds.dataset(parquet_dir, format='parquet', partitioning='hive')
+    expression = filter
+    for name, values in (('year', years), ('quarter', quarters)):
+        if values is not None:
+            condition = ds.field(name).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
@@ -0,0 +1,74 @@
+import time
+import json
+import argparse
+from functools import partial
+import numpy as np
+import pandas as pd
+from lcd_values import parse_lcd_values, FLAG_SUSPECT, FLAG_TRACE, FLAG_MISSING
+
+# Compares parse_lcd_values with the pd.to_numeric(..., errors='coerce') calls it
+# replaces, on a synthetic column shaped like HourlyDryBulbTemperature: mostly plain
+# integers, some decimals, a share of suspect ("45s"), trace ("T") and missing values.
+#
+#   python3 lcd_benchmark.py --rows 5000000
+
+
+def make_column(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    numbers = rng.integers(-40, 110, rows).astype(str).astype(object)
+    kind = rng.random(rows)
+    decimals = kind < 0.10
+    numbers[decimals] = [f"{value:.2f}" for value in rng.uniform(-40, 110, decimals.sum())]
+    suspect = (kind >= 0.10) & (kind < 0.13)
+    numbers[suspect] = [f"{value}s" for value in numbers[suspect]]
+    numbers[(kind >= 0.13) & (kind < 0.15)] = 'T'
+    numbers[(kind >= 0.15) & (kind < 0.18)] = 'M'
+    numbers[kind >= 0.97] = None
+    return pd.Series(numbers, dtype=object)
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def benchmark(rows, repeat):
+    column = make_column(rows)
+    coerce_s, coerced = best_of(repeat, partial(pd.to_numeric, errors='coerce'), column)
+    parse_s, (values, flags) = best_of(repeat, parse_lcd_values, column)
+
+    # Wherever to_numeric produced a number the parser must agree exactly
+    parsed_ok = coerced.notna().to_numpy()
+    mismatches = int((values[parsed_ok] != coerced.to_numpy()[parsed_ok]).sum())
+    return {
+        'rows': rows,
+        'to_numeric_s': coerce_s,
+        'parse_lcd_values_s': parse_s,
+        'speedup': coerce_s / parse_s if parse_s else None,
+        'mismatches': mismatches,
+        'values_kept': {
+            'to_numeric': int(parsed_ok.sum()),
+            'parse_lcd_values': int(np.isfinite(values).sum()),
+        },
+        'flags': {
+            'suspect': int(((flags & FLAG_SUSPECT) != 0).sum()),
+            'trace': int(((flags & FLAG_TRACE) != 0).sum()),
+            'missing': int(((flags & FLAG_MISSING) != 0).sum()),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse_lcd_values against pd.to_numeric.")
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--repeat', type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
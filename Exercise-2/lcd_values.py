@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# Vectorised parser for LCD hourly/daily value fields.
+# LCD values are text: "45", "-3", "29.92", "45s" (suspect), "T" (trace, 0.0),
+# "M" or blank (missing). parse_lcd_values turns a column of them into a float64
+# array plus a uint8 flag array in one pass over a fixed-width byte matrix, so a
+# suspect reading keeps its number instead of becoming NaN.
+#
+#   values, flags = parse_lcd_values(chunk['HourlyDryBulbTemperature'])
+#   suspect = (flags & FLAG_SUSPECT) != 0
+
+FLAG_SUSPECT = 1
+FLAG_TRACE = 2
+FLAG_MISSING = 4
+
+_ZERO, _NINE = ord('0'), ord('9')
+_DOT, _MINUS, _PLUS = ord('.'), ord('-'), ord('+')
+_SPACE, _SUSPECT, _TRACE = ord(' '), ord('s'), ord('T')
+# Powers of ten up to 1e22 are exact doubles
+_POWERS = 10.0 ** np.arange(23)
+# Up to 15 digits the mantissa is below 2**53, so it is an exact double too and
+# mantissa / power is correctly rounded, the same as float(). Longer values go
+# through float() instead.
+_MAX_DIGITS = 15
+
+
+def _byte_columns(values):
+    # (width, rows) uint8 matrix of the values as NUL-padded ASCII, one contiguous
+    # row per character position. None and NaN come out as b'None'/b'nan', which
+    # fail the parse like any other non-number.
+    array = np.asarray(values, dtype=object)
+    try:
+        encoded = array.astype('S')
+    except UnicodeEncodeError:
+        # Anything non-ASCII can't be a number; '?' makes it fail the parse below
+        encoded = pd.Series(array).str.encode('ascii', errors='replace').to_numpy().astype('S')
+    if encoded.dtype.itemsize == 0:
+        encoded = encoded.astype('S1')
+    matrix = encoded.view(np.uint8).reshape(len(encoded), encoded.dtype.itemsize)
+    return np.ascontiguousarray(matrix.T)
+
+
+def parse_lcd_values(values):
+    # Returns (float64 values, uint8 flags) for a Series/array of LCD strings.
+    # Suspect readings keep their value with FLAG_SUSPECT set, trace is 0.0 with
+    # FLAG_TRACE, and anything blank, "M" or otherwise unparsable is NaN with
+    # FLAG_MISSING.
+    columns = _byte_columns(values)
+    width, rows = columns.shape
+    # Spaces are ignored like the NULs numpy pads with
+    columns[columns == _SPACE] = 0
+
+    # The last non-blank character decides suspect ("45s") and, alone, trace ("T")
+    lengths = np.zeros(rows, dtype=np.int64)
+    last_pos = np.zeros(rows, dtype=np.int64)
+    for position, byte in enumerate(columns):
+        present = byte != 0
+        lengths += present
+        last_pos[present] = position
+    index = np.arange(rows)
+    last = columns[last_pos, index]
+    flags = np.zeros(rows, dtype=np.uint8)
+    suspect = (last == _SUSPECT) & (lengths > 1)
+    flags[suspect] = FLAG_SUSPECT
+    trace = (lengths == 1) & (last == _TRACE)
+    flags[trace] = FLAG_TRACE
+    columns[last_pos[suspect], index[suspect]] = 0
+
+    # One vectorised step per character position (a handful for LCD values), each
+    # over a contiguous array: Horner's rule for the digits, frac counts digits
+    # after the dot, and any byte other than digit/dot/leading sign invalidates the row
+    mantissa = np.zeros(rows, dtype=np.int64)
+    frac = np.zeros(rows, dtype=np.int64)
+    digits = np.zeros(rows, dtype=np.int64)
+    started = np.zeros(rows, dtype=bool)
+    seen_dot = np.zeros(rows, dtype=bool)
+    invalid = np.zeros(rows, dtype=bool)
+    negative = np.zeros(rows, dtype=bool)
+    for byte in columns:
+        digit = byte - np.uint8(_ZERO)
+        is_digit = digit <= 9
+        is_dot = byte == _DOT
+        is_minus = byte == _MINUS
+        is_sign = is_minus | (byte == _PLUS)
+        invalid |= ~(is_digit | is_dot | is_sign | (byte == 0))
+        invalid |= (is_sign & started) | (is_dot & seen_dot)
+        negative |= is_minus
+        mantissa = np.where(is_digit, mantissa * 10 + digit, mantissa)
+        frac += is_digit & seen_dot
+        digits += is_digit
+        started |= is_digit | is_dot | is_sign
+        seen_dot |= is_dot
+
+    parsed = mantissa / _POWERS[np.minimum(frac, len(_POWERS) - 1)]
+    parsed[negative] = -parsed[negative]
+    # Too many digits for an exact mantissa (never a real LCD value): float() each one
+    too_long = np.flatnonzero((digits > _MAX_DIGITS) & ~invalid)
+    if len(too_long):
+        texts = np.asarray(values, dtype=object)[too_long]
+        for row, text in zip(too_long, texts):
+            text = str(text).replace(' ', '')
+            try:
+                parsed[row] = float(text[:-1] if suspect[row] else text)
+            except ValueError:
+                invalid[row] = True
+    parsed[trace] = 0.0
+    missing = (invalid | (digits == 0)) & ~trace
+    parsed[missing] = np.nan
+    flags[missing] = FLAG_MISSING
+    return parsed, flags
+
+
+def lcd_numeric(values):
+    # Drop-in for pd.to_numeric(values, errors='coerce') that keeps suspect and
+    # trace readings; returns a float Series aligned with values when given one
+    parsed, _ = parse_lcd_values(values)
+    if isinstance(values, pd.Series):
+        return pd.Series(parsed, index=values.index, name=values.name)
+    return parsed
@@ -1,22 +1,551 @@
 import os
+import sys
+import json
 import time
+import bisect
+import requests
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support import expected_conditions as EC
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from html.parser import HTMLParser
+from lcd_values import lcd_numeric
+import zone_maps
 
 # --- Configuration ---
 url = 'https://www.ncei.noaa.gov/data/local-climatological-data/access/2021/'
 # Use a raw string (r'') for Windows paths to avoid issues with backslashes acting as escape characters.
-DOWNLOAD_DIR = r'C:\Projects\Docker\Exercises\Exercise-2\Downloads'
+# Set DOWNLOAD_DIR in the environment to override it (e.g. inside the container).
+DOWNLOAD_DIR = os.environ.get('DOWNLOAD_DIR', r'C:\Projects\Docker\Exercises\Exercise-2\Downloads')
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 DEFAULT_WAIT_TIME = 10 
+# 2024-01-19 10:27 does exist on the example page.So taking a different one, You can put your desired timestamp
+TARGET_TIMESTAMP = "2024-01-19 14:55"
+CHUNK_SIZE = 1024 * 1024
+# Parallel downloads when fetching every file that matches a timestamp
+FETCH_WORKERS = 4
+# Upper bound on waiting for Chrome to finish a download in browser mode
+DOWNLOAD_TIMEOUT = 300
+
+# Streaming analysis reads only these columns (plus the one being queried), with
+# explicit dtypes, ANALYSIS_CHUNK_ROWS rows at a time. LCD value columns stay strings
+# on read because they carry flags like "45s" or "T".
+OUTPUT_COLUMNS = ['STATION', 'DATE', 'NAME', 'REPORT_TYPE', 'HourlyDryBulbTemperature',
+                  'HourlyDewPointTemperature', 'DailyAverageDryBulbTemperature']
+LCD_DTYPES = {
+    'STATION': 'str', 'DATE': 'str', 'NAME': 'str', 'REPORT_TYPE': 'str', 'SOURCE': 'str',
+    'LATITUDE': 'float64', 'LONGITUDE': 'float64', 'ELEVATION': 'float64',
+}
+ANALYSIS_CHUNK_ROWS = 100_000
+
+# Year-wide batch mode: min/max/mean of these columns over every station file, plus
+# the rows holding the highest HourlyDryBulbTemperature, fanned out over processes.
+BATCH_COLUMNS = ['HourlyDryBulbTemperature', 'HourlyDewPointTemperature', 'DailyAverageDryBulbTemperature']
+BATCH_WORKERS = os.cpu_count() or 1
+# On-disk copies of year listings, one JSON file per year directory
+INDEX_DIR = os.environ.get('INDEX_DIR', os.path.join(DOWNLOAD_DIR, 'index'))
+
+# One row of the Apache-style index table
+ListingEntry = namedtuple('ListingEntry', ['name', 'last_modified', 'size'])
+
+
+# --- Browserless Listing Parser ---
+class ListingParser(HTMLParser):
+    # Streaming parser for the directory index: feed() it the page in pieces and
+    # collect the finished rows from .entries as they complete.
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+        self._in_table = False
+        self._cells = None
+        self._cell_text = None
+        self._link_cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self._in_table = True
+        elif not self._in_table:
+            return
+        elif tag == 'tr':
+            self._cells = []
+            self._link_cell = None
+        elif tag in ('td', 'th') and self._cells is not None:
+            self._cell_text = []
+        elif tag == 'a' and self._cell_text is not None and self._link_cell is None:
+            href = dict(attrs).get('href', '')
+            # Skip sorting links and "Parent Directory"
+            if href and not href.startswith(('?', '/', '..')):
+                self._link_cell = len(self._cells)
+
+    def handle_data(self, data):
+        if self._cell_text is not None:
+            self._cell_text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            self._in_table = False
+        elif tag in ('td', 'th') and self._cell_text is not None:
+            self._cells.append(''.join(self._cell_text).strip())
+            self._cell_text = None
+        elif tag == 'tr' and self._cells is not None:
+            # Name cell, then Last modified, then Size
+            i = self._link_cell
+            if i is not None and len(self._cells) > i + 2:
+                self.entries.append(ListingEntry(self._cells[i], self._cells[i + 1], self._cells[i + 2]))
+            self._cells = None
+
+
+def parse_listing(response, chunk_size=64 * 1024):
+    # Yields ListingEntry rows while the page is still downloading, so a caller
+    # looking for one file can stop as soon as it shows up.
+    parser = ListingParser()
+    response.encoding = response.encoding or 'utf-8'
+    for text in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
+        parser.feed(text)
+        yield from parser.entries
+        parser.entries.clear()
+    parser.close()
+    yield from parser.entries
+
+
+def iter_listing(listing_url, chunk_size=64 * 1024):
+    with requests.get(listing_url, stream=True, timeout=DEFAULT_WAIT_TIME) as response:
+        response.raise_for_status()
+        yield from parse_listing(response, chunk_size)
+
+
+def download_file(file_url, dest_path, chunk_size=CHUNK_SIZE):
+    # Streams into <dest>.part and renames only once the byte count matches
+    # Content-Length, so a file at dest_path is always complete.
+    part_path = dest_path + '.part'
+    written = 0
+    with requests.get(file_url, stream=True, timeout=DEFAULT_WAIT_TIME) as response:
+        response.raise_for_status()
+        # With a Content-Encoding the header counts encoded bytes, not what we write
+        expected = None if response.headers.get('Content-Encoding') else response.headers.get('Content-Length')
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+    if expected is not None and written != int(expected):
+        os.remove(part_path)
+        raise IOError(f"Incomplete download of {file_url}: got {written} of {expected} bytes")
+    os.replace(part_path, dest_path)
+    return dest_path
+
+
+def fetch_files(entries, workers=FETCH_WORKERS):
+    # Downloads entries on a bounded pool and yields (entry, path) as each one
+    # completes, so analysis can start on the first file while the rest transfer.
+    # Once the caller is done with a file its stats sidecar is queued on a single
+    # background thread, so only one build is ever holding memory.
+    with ThreadPoolExecutor(max_workers=1) as sidecars, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(download_file, url + entry.name, os.path.join(DOWNLOAD_DIR, entry.name)): entry
+                   for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                path = future.result()
+            except (requests.RequestException, OSError) as e:
+                print(f"Download failed for {entry.name}: {e}")
+                continue
+            yield entry, path
+            if path.endswith('.csv'):
+                sidecars.submit(zone_maps.zone_map_for, path)
+
+
+def wait_for_download(path, timeout=DOWNLOAD_TIMEOUT, poll=0.5):
+    # Chrome writes to <name>.crdownload and renames when done; wait for that rename
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path) and not os.path.exists(path + '.crdownload'):
+            return True
+        time.sleep(poll)
+    return False
+
+
+# --- Listing Index ---
+class ListingIndex:
+    # Local copy of one year listing, kept as (timestamp, name, size) tuples sorted
+    # by timestamp so exact and range lookups are binary searches. Timestamps are
+    # "YYYY-MM-DD HH:MM", which sort correctly as plain strings.
+    def __init__(self, listing_url, path=None):
+        self.listing_url = listing_url
+        year = listing_url.rstrip('/').split('/')[-1]
+        self.path = path or os.path.join(INDEX_DIR, f"{year}.json")
+        self.etag = None
+        self.last_modified = None
+        self.records = []
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.etag = data.get('etag')
+        self.last_modified = data.get('last_modified')
+        self.records = [tuple(record) for record in data.get('records', [])]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'url': self.listing_url, 'etag': self.etag, 'last_modified': self.last_modified,
+                       'records': self.records}, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self):
+        # Conditional GET first; if the listing did change, apply only the rows that
+        # were added, removed or re-stamped instead of rebuilding the sorted list.
+        # Returns (added, removed, changed) counts.
+        headers = {}
+        if self.records and self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.records and self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        with requests.get(self.listing_url, headers=headers, stream=True, timeout=DEFAULT_WAIT_TIME) as response:
+            if response.status_code == 304:
+                return 0, 0, 0
+            response.raise_for_status()
+            listing = {entry.name: (entry.last_modified, entry.size) for entry in parse_listing(response)}
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+
+        cached = {name: (timestamp, size) for timestamp, name, size in self.records}
+        added = removed = changed = 0
+        for name, (timestamp, size) in cached.items():
+            if name not in listing:
+                self._remove((timestamp, name, size))
+                removed += 1
+        for name, (timestamp, size) in listing.items():
+            old = cached.get(name)
+            if old == (timestamp, size):
+                continue
+            if old is None:
+                added += 1
+            else:
+                self._remove((old[0], name, old[1]))
+                changed += 1
+            bisect.insort(self.records, (timestamp, name, size))
+        self.save()
+        return added, removed, changed
+
+    def _remove(self, record):
+        i = bisect.bisect_left(self.records, record)
+        if i < len(self.records) and self.records[i] == record:
+            del self.records[i]
+
+    def between(self, start, end):
+        # Every file last modified in [start, end], both ends inclusive
+        lo = bisect.bisect_left(self.records, (start,))
+        hi = bisect.bisect_right(self.records, (end, chr(0x10FFFF)))
+        return [ListingEntry(name, timestamp, size) for timestamp, name, size in self.records[lo:hi]]
+
+    def find(self, timestamp):
+        return self.between(timestamp, timestamp)
+
+
+# --- Data Analysis with Pandas ---
+def iter_lcd_chunks(csv_file_path, columns, chunksize=ANALYSIS_CHUNK_ROWS):
+    # Column-pruned, explicitly typed chunks; columns missing from a file are skipped
+    wanted = set(columns)
+    dtypes = {column: LCD_DTYPES.get(column, 'str') for column in columns}
+    return pd.read_csv(csv_file_path, usecols=lambda column: column in wanted, dtype=dtypes,
+                       chunksize=chunksize)
+
+
+def stream_max_rows(csv_file_path, column='HourlyDryBulbTemperature', output_columns=OUTPUT_COLUMNS,
+                    chunksize=ANALYSIS_CHUNK_ROWS):
+    # One pass, bounded memory: keep the running max and only the rows tied for it.
+    # Returns (max value, DataFrame of those rows); the max is None if no value parses.
+    columns = list(dict.fromkeys([*output_columns, column]))
+    best = None
+    tied = []
+    for chunk in iter_lcd_chunks(csv_file_path, columns, chunksize):
+        values = lcd_numeric(chunk[column])
+        best, tied = track_max(best, tied, chunk, values)
+    rows = pd.concat(tied) if tied else pd.DataFrame(columns=columns)
+    return best, rows
+
+
+def stream_rows_in_range(csv_file_path, column, low=None, high=None, date_from=None, date_to=None,
+                         output_columns=OUTPUT_COLUMNS, chunksize=ANALYSIS_CHUNK_ROWS):
+    # Rows whose column value is within [low, high] and DATE within [date_from, date_to]
+    # (None leaves a side open; dates compare as ISO strings, like the zone maps)
+    columns = list(dict.fromkeys([*output_columns, column, 'DATE']))
+    matches = []
+    for chunk in iter_lcd_chunks(csv_file_path, columns, chunksize):
+        if column not in chunk:
+            break
+        values = lcd_numeric(chunk[column])
+        keep = values.notna()
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values <= high
+        if date_from is not None:
+            keep &= chunk['DATE'] >= date_from
+        if date_to is not None:
+            keep &= chunk['DATE'] <= date_to
+        if keep.any():
+            matches.append(chunk[keep])
+    return pd.concat(matches) if matches else pd.DataFrame(columns=columns)
+
+
+def track_max(best, tied, chunk, values):
+    # Folds one chunk into a running (max, list of tied row frames) pair
+    chunk_max = values.max()
+    if pd.isna(chunk_max):
+        return best, tied
+    if best is None or chunk_max > best:
+        return chunk_max, [chunk[values == chunk_max]]
+    if chunk_max == best:
+        tied.append(chunk[values == chunk_max])
+    return best, tied
+
+
+# --- Year-wide Batch Analysis ---
+def summarize_station(csv_file_path, columns=BATCH_COLUMNS, max_column='HourlyDryBulbTemperature',
+                      output_columns=OUTPUT_COLUMNS, chunksize=ANALYSIS_CHUNK_ROWS):
+    # Runs in a worker process. Returns a small, mergeable partial instead of a
+    # DataFrame: min/max/sum/count per column and the rows tied for the file's max.
+    stats = {column: {'min': None, 'max': None, 'sum': 0.0, 'count': 0} for column in columns}
+    best = None
+    tied = []
+    wanted = list(dict.fromkeys([*output_columns, *columns, max_column]))
+    try:
+        for chunk in iter_lcd_chunks(csv_file_path, wanted, chunksize):
+            for column in columns:
+                if column not in chunk:
+                    continue
+                values = lcd_numeric(chunk[column])
+                merge_stats(stats[column], {'min': values.min(), 'max': values.max(),
+                                            'sum': values.sum(), 'count': int(values.count())})
+                if column == max_column:
+                    best, tied = track_max(best, tied, chunk, values)
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        return {'file': csv_file_path, 'error': str(e)}
+    rows = pd.concat(tied).to_dict('records') if tied else []
+    return {'file': csv_file_path, 'stats': stats,
+            'max_value': None if best is None else float(best), 'max_rows': rows}
+
+
+def merge_stats(total, part):
+    if not part['count']:
+        return total
+    total['min'] = part['min'] if total['min'] is None else min(total['min'], part['min'])
+    total['max'] = part['max'] if total['max'] is None else max(total['max'], part['max'])
+    total['sum'] += float(part['sum'])
+    total['count'] += part['count']
+    return total
+
+
+def merge_partials(partials, columns=BATCH_COLUMNS):
+    # Folds partials in as they arrive; only the current best rows are kept
+    result = {'files': 0, 'errors': [], 'max_value': None, 'max_rows': [],
+              'stats': {column: {'min': None, 'max': None, 'sum': 0.0, 'count': 0} for column in columns}}
+    for partial in partials:
+        result['files'] += 1
+        if 'error' in partial:
+            result['errors'].append((partial['file'], partial['error']))
+            continue
+        for column in columns:
+            merge_stats(result['stats'][column], partial['stats'][column])
+        value = partial['max_value']
+        if value is None:
+            continue
+        if result['max_value'] is None or value > result['max_value']:
+            result['max_value'] = value
+            result['max_rows'] = list(partial['max_rows'])
+        elif value == result['max_value']:
+            result['max_rows'].extend(partial['max_rows'])
+    for stats in result['stats'].values():
+        stats['mean'] = stats['sum'] / stats['count'] if stats['count'] else None
+    return result
+
+
+def summarize_year(csv_paths, workers=BATCH_WORKERS):
+    # chunksize batches many small files per task so IPC overhead stays negligible
+    chunksize = max(1, len(csv_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_partials(executor.map(summarize_station, csv_paths, chunksize=chunksize))
+
+
+def list_station_files(csv_dir=DOWNLOAD_DIR):
+    return sorted(os.path.join(csv_dir, name) for name in os.listdir(csv_dir) if name.endswith('.csv'))
+
+
+def summarize_year_from_zone_maps(csv_paths, workers=BATCH_WORKERS, max_column='HourlyDryBulbTemperature',
+                                  columns=BATCH_COLUMNS):
+    # Same result as summarize_year, but min/max/mean come from the zone-map sidecars
+    # and only the files holding the year's max are opened, for its rows
+    maps = zone_maps.load_zone_maps(csv_paths, workers)
+    max_value, paths = zone_maps.extreme_files(maps, max_column)
+    rows = [stream_rows_in_range(path, max_column, max_value, max_value) for path in paths]
+    return {
+        'files': len(csv_paths),
+        'opened': len(paths),
+        'errors': [(path, 'no zone map, file could not be parsed') for path, zone_map in maps.items()
+                   if zone_map is None],
+        'stats': {column: zone_maps.column_stats(maps, column) for column in columns},
+        'max_value': max_value,
+        'max_rows': pd.concat(rows).to_dict('records') if rows else [],
+    }
+
+
+def run_year_batch(csv_dir=DOWNLOAD_DIR, download=False, workers=BATCH_WORKERS, use_zone_maps=True):
+    # Highest HourlyDryBulbTemperature (and min/max/mean of BATCH_COLUMNS) across
+    # every station file of the year. With download, the whole listing is fetched
+    # into csv_dir first. use_zone_maps=False scans every file instead of the sidecars.
+    if download:
+        index = ListingIndex(url)
+        index.refresh()
+        entries = [ListingEntry(name, timestamp, size) for timestamp, name, size in index.records
+                   if not os.path.exists(os.path.join(csv_dir, name))]
+        print(f"Downloading {len(entries)} station files with {FETCH_WORKERS} workers")
+        for _ in fetch_files(entries):
+            pass
+
+    csv_paths = list_station_files(csv_dir)
+    if not csv_paths:
+        print(f"No station CSV files found in {csv_dir}.")
+        return None
+
+    start = time.perf_counter()
+    if use_zone_maps:
+        result = summarize_year_from_zone_maps(csv_paths, workers)
+        print(f"\nAnalysed {result['files']} station files from their zone maps, opened {result['opened']}, "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        result = summarize_year(csv_paths, workers)
+        print(f"\nAnalysed {result['files']} station files with {workers} processes "
+              f"in {time.perf_counter() - start:.1f}s")
+    for file_path, error in result['errors']:
+        print(f"Skipped {file_path}: {error}")
+    for column, stats in result['stats'].items():
+        print(f"{column}: min={stats['min']} max={stats['max']} mean={stats['mean']} (n={stats['count']})")
+    print(f"\nHighest 'HourlyDryBulbTemperature' across the year: {result['max_value']}")
+    print(f"Rows with the highest HourlyDryBulbTemperature:\n{pd.DataFrame(result['max_rows'])}")
+    return result
+
+
+def run_range_query(column, low=None, high=None, date_from=None, date_to=None, csv_dir=DOWNLOAD_DIR,
+                    workers=BATCH_WORKERS):
+    # Every row of the year with column in [low, high] (and DATE in range), reading
+    # only the files whose zone map says they can hold such a row
+    csv_paths = list_station_files(csv_dir)
+    maps = zone_maps.load_zone_maps(csv_paths, workers)
+    paths = zone_maps.files_in_range(maps, column, low, high, date_from, date_to)
+    print(f"{len(paths)} of {len(csv_paths)} station files can hold {column} in [{low}, {high}]")
+    frames = [stream_rows_in_range(path, column, low, high, date_from, date_to) for path in paths]
+    rows = pd.concat(frames) if frames else pd.DataFrame()
+    print(f"Rows with {column} in [{low}, {high}]:\n{rows}")
+    return rows
+
+
+def analyze_csv(csv_file_path, streaming=True):
+    print(f"\nAttempting to read CSV file: {csv_file_path}")
+    if not os.path.exists(csv_file_path):
+        print(f"Error: Downloaded file '{os.path.basename(csv_file_path)}' not found at '{os.path.dirname(csv_file_path)}'.")
+        return
+    try:
+        if streaming:
+            max_dry_bulb_temp, rows_with_max_temp = stream_max_rows(csv_file_path)
+            print(f"\nSuccessfully read CSV. Highest 'HourlyDryBulbTemperature' found: {max_dry_bulb_temp}")
+            print(f'Rows with the highest HourlyDryBulbTemperature:\n{rows_with_max_temp}')
+            return
+
+        df = pd.read_csv(csv_file_path)
+
+        # Convert temperature columns to numeric. These columns carry flags like
+        # '45s' (suspect) or 'T' (trace); lcd_numeric keeps those readings and only
+        # blanks, 'M' and other non-numbers become NaN.
+        df['HourlyDryBulbTemperature'] = lcd_numeric(df['HourlyDryBulbTemperature'])
+        df['HourlyDewPointTemperature'] = lcd_numeric(df['HourlyDewPointTemperature'])
+        # Convert DailyAverageDryBulbTemperature too for consistency if needed for other ops
+        df['DailyAverageDryBulbTemperature'] = lcd_numeric(df['DailyAverageDryBulbTemperature'])
+
+        # Find the highest 'HourlyDryBulbTemperature' value
+        # .max() requires parentheses to call the method.
+        max_dry_bulb_temp = df['HourlyDryBulbTemperature'].max()
+
+        # Filter the DataFrame to show all rows with this maximum temperature
+        rows_with_max_temp = df[df['HourlyDryBulbTemperature'] == max_dry_bulb_temp]
+
+        print(f"\nSuccessfully read CSV. Highest 'HourlyDryBulbTemperature' found: {max_dry_bulb_temp}")
+        print(f'Rows with the highest HourlyDryBulbTemperature:\n{rows_with_max_temp}')
+
+    except FileNotFoundError:
+        print(f"Error: The file {csv_file_path} was not found. Download might have failed or name is incorrect.")
+    except pd.errors.EmptyDataError:
+        print(f"Error: The file {csv_file_path} is empty.")
+    except Exception as pandas_error:
+        print(f"An error occurred during Pandas processing: {pandas_error}")
+        import traceback
+        traceback.print_exc() # Print full traceback for debugging Pandas issues
+
+
+# --- Browserless Scrape ---
+def run_http_fetch_all(target_timestamp=TARGET_TIMESTAMP, workers=FETCH_WORKERS):
+    # Every file stamped target_timestamp (many stations share one), downloaded
+    # concurrently and analysed the moment each transfer is verified complete.
+    try:
+        index = ListingIndex(url)
+        index.refresh()
+        matches = index.find(target_timestamp)
+        if not matches:
+            print(f"File with timestamp '{target_timestamp}' not found on the page. No download initiated.")
+            return
+
+        print(f"Found {len(matches)} files with timestamp {target_timestamp}, downloading with {workers} workers")
+        for entry, csv_file_path in fetch_files(matches, workers):
+            print(f"Downloaded {entry.name} ({entry.size})")
+            analyze_csv(csv_file_path)
+
+    except requests.RequestException as e:
+        print(f"An HTTP error occurred while fetching {url}: {e}")
+
+
+def run_http_scrap(target_timestamp=TARGET_TIMESTAMP, use_index=True):
+    # Same job as run_web_scrap without a browser: find the row with the target
+    # timestamp over plain HTTP and download it directly. With use_index the lookup
+    # goes through the cached ListingIndex, otherwise the page is streamed and the
+    # scan stops at the first match.
+    try:
+        if use_index:
+            index = ListingIndex(url)
+            added, removed, changed = index.refresh()
+            print(f'Listing index {index.path}: {len(index.records)} files '
+                  f'({added} added, {removed} removed, {changed} changed)')
+            target = next(iter(index.find(target_timestamp)), None)
+        else:
+            print(f'Loading listing: {url}')
+            target = next((entry for entry in iter_listing(url) if entry.last_modified == target_timestamp), None)
+        if target is None:
+            print(f"File with timestamp '{target_timestamp}' not found on the page. No download initiated.")
+            return
+
+        print(f"Found target File: {target.name} with timestamp: {target.last_modified} ({target.size})")
+        csv_file_path = download_file(url + target.name, os.path.join(DOWNLOAD_DIR, target.name))
+        print(f"Downloaded {target.name} to {DOWNLOAD_DIR}.")
+        analyze_csv(csv_file_path)
+
+    except requests.RequestException as e:
+        print(f"An HTTP error occurred while fetching {url}: {e}")
+
+
+def run_web_scrap(target_timestamp=TARGET_TIMESTAMP):
+    # Selenium is only needed for this browser-driven mode, so it is imported here
+    # and the default HTTP mode runs without it.
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.support.ui import WebDriverWait
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium.webdriver.support import expected_conditions as EC
 
-def run_web_scrap():
     driver = None # Initialize driver to None, good practice for the finally block
     downloaded_file_name = None # Variable to store the name of the file actually clicked/downloaded
 
@@ -66,8 +595,6 @@ def run_web_scrap():
         rows = table.find_elements(By.TAG_NAME, 'tr')
 
         target_file_link = None
-        # 2024-01-19 10:27 does exist on the example page.So taking a different one, You can put your desired timestamp
-        target_timestamp = "2024-01-19 14:55"     
 
         # Iterate through each row to find the desired file
         # We start from index 2 to skip the header row and the <hr> row as seen on NOAA page structure.
@@ -101,51 +628,18 @@ def run_web_scrap():
             target_file_link.click()  # Click the link to trigger the download
             print(f"Clicked on {downloaded_file_name} to initiate download.")
  
-            # Give the browser some time to process the download.
-            # This is a critical time.sleep for download completion.
-            # You might need to increase this if files are large or internet is slow.
-            # A more advanced approach would be to wait until the file appears in the directory.
-            print(f"Waiting {DEFAULT_WAIT_TIME + 7} seconds for download to complete...")
-            time.sleep(DEFAULT_WAIT_TIME + 7)
-            print(f"Download process initiated. Check {DOWNLOAD_DIR} for the file.")
-
             # --- 6. Data Analysis with Pandas ---
             # Ensure we're reading the file that was actually downloaded.
             # Use os.path.join for robust path construction.
             csv_file_path = os.path.join(DOWNLOAD_DIR, downloaded_file_name)
 
-            print(f"\nAttempting to read CSV file: {csv_file_path}")
-            if os.path.exists(csv_file_path):
-                try:
-                    df = pd.read_csv(csv_file_path)
-
-                    # Convert temperature columns to numeric, coercing errors to NaN
-                    # This is CRUCIAL as these columns often contain non-numeric data like 'T' or blanks.
-                    df['HourlyDryBulbTemperature'] = pd.to_numeric(df['HourlyDryBulbTemperature'], errors='coerce')
-                    df['HourlyDewPointTemperature'] = pd.to_numeric(df['HourlyDewPointTemperature'], errors='coerce')
-                    # Convert DailyAverageDryBulbTemperature too for consistency if needed for other ops
-                    df['DailyAverageDryBulbTemperature'] = pd.to_numeric(df['DailyAverageDryBulbTemperature'], errors='coerce')
-
-                    # Find the highest 'HourlyDryBulbTemperature' value
-                    # .max() requires parentheses to call the method.
-                    max_dry_bulb_temp = df['HourlyDryBulbTemperature'].max()
-
-                    # Filter the DataFrame to show all rows with this maximum temperature
-                    rows_with_max_temp = df[df['HourlyDryBulbTemperature'] == max_dry_bulb_temp]
-
-                    print(f"\nSuccessfully read CSV. Highest 'HourlyDryBulbTemperature' found: {max_dry_bulb_temp}")
-                    print(f'Rows with the highest HourlyDryBulbTemperature:\n{rows_with_max_temp}')
-
-                except FileNotFoundError:
-                    print(f"Error: The file {csv_file_path} was not found. Download might have failed or name is incorrect.")
-                except pd.errors.EmptyDataError:
-                    print(f"Error: The file {csv_file_path} is empty.")
-                except Exception as pandas_error:
-                    print(f"An error occurred during Pandas processing: {pandas_error}")
-                    import traceback
-                    traceback.print_exc() # Print full traceback for debugging Pandas issues
-            else:
-                print(f"Error: Downloaded file '{downloaded_file_name}' not found at '{DOWNLOAD_DIR}'.")
+            # Wait for Chrome to finish the file rather than sleeping a fixed time
+            print(f"Waiting up to {DOWNLOAD_TIMEOUT} seconds for download to complete...")
+            if not wait_for_download(csv_file_path):
+                print(f"Download of {downloaded_file_name} did not finish within {DOWNLOAD_TIMEOUT} seconds.")
+                return
+
+            analyze_csv(csv_file_path)
 
         else:
             print(f"File with timestamp '{target_timestamp}' not found on the page. No download initiated.")
@@ -161,5 +655,21 @@ def run_web_scrap():
             print("Browser closed.")
 
 # --- Executes the Web Scraping Function ---
+# python main.py [http|all|year|browser]; http (no browser needed) is the default,
+# all fetches every file with the target timestamp, year analyses every station
+# file in DOWNLOAD_DIR.
+# python main.py range COLUMN LOW [HIGH] lists the rows of every station file with
+# COLUMN in that range; use - to leave LOW open.
 if __name__ == "__main__":
-    run_web_scrap()
\ No newline at end of file
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'http'
+    if mode == 'browser':
+        run_web_scrap()
+    elif mode == 'all':
+        run_http_fetch_all()
+    elif mode == 'year':
+        run_year_batch()
+    elif mode == 'range':
+        bounds = [None if bound == '-' else float(bound) for bound in sys.argv[3:5]]
+        run_range_query(sys.argv[2], *bounds)
+    else:
+        run_http_scrap()
\ No newline at end of file
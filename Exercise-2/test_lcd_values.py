@@ -0,0 +1,88 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from lcd_values import parse_lcd_values, lcd_numeric, FLAG_SUSPECT, FLAG_TRACE, FLAG_MISSING
+
+
+def parse_one(text):
+    values, flags = parse_lcd_values(pd.Series([text], dtype=object))
+    return values[0], int(flags[0])
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('45', 45.0),
+    ('-3', -3.0),
+    ('29.92', 29.92),
+    ('+5', 5.0),
+    ('.5', 0.5),
+    ('5.', 5.0),
+    (' 7 ', 7.0),
+    ('0.0001', 0.0001),
+])
+def test_plain_numbers(text, expected):
+    value, flags = parse_one(text)
+    assert value == expected
+    assert flags == 0
+
+
+def test_suspect_keeps_its_value():
+    assert parse_one('45s') == (45.0, FLAG_SUSPECT)
+    assert parse_one('-2.5s') == (-2.5, FLAG_SUSPECT)
+
+
+def test_trace_is_zero():
+    assert parse_one('T') == (0.0, FLAG_TRACE)
+
+
+@pytest.mark.parametrize('text', ['M', '', None, float('nan'), '--5', '1.2.3', '5-', 's', 'Ts', 'abc',
+                                  'inf', 'nan', '1e5', 'é5', '５', '45°'])
+def test_missing_and_invalid(text):
+    value, flags = parse_one(text)
+    assert math.isnan(value)
+    assert flags == FLAG_MISSING
+
+
+@pytest.mark.parametrize('text', ['12345678901234567890', '99999999999.999999999', '-1234567890123456789012',
+                                  '0000000000000000000042', '123456789012345678'])
+def test_long_digit_strings_do_not_overflow(text):
+    value, flags = parse_one(text)
+    assert value == float(text)
+    assert flags == 0
+
+
+def test_long_suspect_value():
+    assert parse_one('12345678901234567890s') == (float('12345678901234567890'), FLAG_SUSPECT)
+
+
+def test_16_to_18_digits_round_like_float():
+    # Past 2**53 the mantissa is no longer exact, so these take the float() path
+    rng = np.random.default_rng(1)
+    texts = pd.Series([f"{value:.{digits}f}" for value, digits in
+                       zip(rng.uniform(1, 10, 2000), rng.integers(15, 18, 2000))], dtype=object)
+    values, _ = parse_lcd_values(texts)
+    assert list(values) == [float(text) for text in texts]
+    assert parse_one('6.4708321257442331') == (float('6.4708321257442331'), 0)
+
+
+def test_agrees_with_to_numeric_on_numbers():
+    rng = np.random.default_rng(0)
+    texts = pd.Series([f"{value:.{digits}f}" for value, digits in
+                       zip(rng.uniform(-1000, 1000, 2000), rng.integers(0, 6, 2000))], dtype=object)
+    values, flags = parse_lcd_values(texts)
+    assert (values == pd.to_numeric(texts).to_numpy()).all()
+    assert not flags.any()
+
+
+def test_mixed_column_and_alignment():
+    series = pd.Series(['45', '45s', 'T', 'M', None, 'é', '12345678901234567890'], index=list('abcdefg'))
+    values, flags = parse_lcd_values(series)
+    assert list(flags) == [0, FLAG_SUSPECT, FLAG_TRACE, FLAG_MISSING, FLAG_MISSING, FLAG_MISSING, 0]
+    numeric = lcd_numeric(series)
+    assert list(numeric.index) == list('abcdefg')
+    assert numeric['a'] == 45.0 and numeric['g'] == float('12345678901234567890')
+
+
+def test_empty_input():
+    values, flags = parse_lcd_values(pd.Series([], dtype=object))
+    assert len(values) == 0 and len(flags) == 0
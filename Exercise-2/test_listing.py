@@ -0,0 +1,187 @@
+import os
+import tempfile
+import pytest
+
+# main creates DOWNLOAD_DIR on import; keep it out of the working tree
+os.environ.setdefault('DOWNLOAD_DIR', tempfile.mkdtemp())
+import main
+from main import ListingEntry, ListingIndex, ListingParser, parse_listing
+
+LISTING_URL = 'https://www.ncei.noaa.gov/data/local-climatological-data/access/2021/'
+PAGE_HEAD = '''<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 3.2 Final//EN">
+<html>
+ <head>
+  <title>Index of /data/local-climatological-data/access/2021</title>
+ </head>
+ <body>
+<h1>Index of /data/local-climatological-data/access/2021</h1>
+  <table>
+   <tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th><th><a href="?C=N;O=D">Name</a></th><th><a href="?C=M;O=A">Last modified</a></th><th><a href="?C=S;O=A">Size</a></th><th><a href="?C=D;O=A">Description</a></th></tr>
+   <tr><th colspan="5"><hr></th></tr>
+<tr><td valign="top"><img src="/icons/back.gif" alt="[PARENTDIR]"></td><td><a href="/data/local-climatological-data/access/">Parent Directory</a></td><td>&nbsp;</td><td align="right">  - </td><td>&nbsp;</td></tr>
+'''
+PAGE_TAIL = '''   <tr><th colspan="5"><hr></th></tr>
+</table>
+<address>Apache Server at www.ncei.noaa.gov Port 443</address>
+</body></html>
+'''
+ROWS = [
+    ('01001099999.csv', '2024-01-19 10:27', '4.1M'),
+    ('01001499999.csv', '2024-01-19 14:55', '9.8M'),
+    ('01002099999.csv', '2024-01-19 14:55', '152K'),
+    ('01003099999.csv', '2024-01-19 15:00', '3.3M'),
+]
+
+
+def page(rows):
+    cells = ''.join(f'<tr><td valign="top"><img src="/icons/unknown.gif" alt="[   ]"></td>'
+                    f'<td><a href="{name}">{name}</a></td><td align="right">{stamp}  </td>'
+                    f'<td align="right">{size}</td><td>&nbsp;</td></tr>\n' for name, stamp, size in rows)
+    return PAGE_HEAD + cells + PAGE_TAIL
+
+
+def entries(rows):
+    return [ListingEntry(name, stamp, size) for name, stamp, size in rows]
+
+
+class FakeResponse:
+    # Just what parse_listing and ListingIndex.refresh use of a requests response
+    def __init__(self, text='', status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.encoding = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise main.requests.HTTPError(self.status_code)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.text), chunk_size):
+            yield self.text[start:start + chunk_size]
+
+
+class FakeServer:
+    # Stands in for requests.get: answers with `response` and records the headers sent
+    def __init__(self, monkeypatch):
+        self.response = None
+        self.sent = []
+        monkeypatch.setattr(main.requests, 'get', self.get)
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(dict(headers or {}))
+        return self.response
+
+
+@pytest.fixture
+def server(monkeypatch):
+    return FakeServer(monkeypatch)
+
+
+# --- Parsing ---
+def test_parser_skips_sorting_and_parent_links():
+    parser = ListingParser()
+    parser.feed(page(ROWS))
+    parser.close()
+    assert parser.entries == entries(ROWS)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 100_000])
+def test_listing_fed_in_fragments(chunk_size):
+    # Fragments split tags, attribute values, &nbsp; and cell text anywhere
+    assert list(parse_listing(FakeResponse(page(ROWS)), chunk_size=chunk_size)) == entries(ROWS)
+
+
+def test_rows_stream_before_the_page_ends():
+    class Truncated(FakeResponse):
+        def iter_content(self, chunk_size=1, decode_unicode=False):
+            head = page(ROWS[:1])
+            yield head[:head.index(PAGE_TAIL)]
+            raise AssertionError("read past the first row")
+
+    assert next(parse_listing(Truncated())) == entries(ROWS[:1])[0]
+
+
+def test_empty_listing():
+    assert list(parse_listing(FakeResponse(page([])))) == []
+
+
+# --- Index refresh ---
+def test_refresh_builds_saves_and_reloads(server, tmp_path):
+    path = str(tmp_path / '2021.json')
+    server.response = FakeResponse(page(ROWS), headers={'ETag': '"v1"', 'Last-Modified': 'Fri, 19 Jan 2024 15:00:00 GMT'})
+    index = ListingIndex(LISTING_URL, path)
+    assert index.refresh() == (len(ROWS), 0, 0)
+    # Nothing cached yet, so nothing conditional
+    assert server.sent == [{}]
+
+    reloaded = ListingIndex(LISTING_URL, path)
+    assert reloaded.records == sorted((stamp, name, size) for name, stamp, size in ROWS)
+    assert reloaded.etag == '"v1"'
+
+
+def test_refresh_304_keeps_the_index(server, tmp_path):
+    path = str(tmp_path / '2021.json')
+    server.response = FakeResponse(page(ROWS), headers={'ETag': '"v1"', 'Last-Modified': 'Fri, 19 Jan 2024 15:00:00 GMT'})
+    ListingIndex(LISTING_URL, path).refresh()
+
+    server.response = FakeResponse(status_code=304)
+    index = ListingIndex(LISTING_URL, path)
+    before = list(index.records)
+    assert index.refresh() == (0, 0, 0)
+    assert server.sent[-1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Fri, 19 Jan 2024 15:00:00 GMT'}
+    assert index.records == before
+
+
+def test_refresh_applies_adds_removes_and_restamps(server, tmp_path):
+    path = str(tmp_path / '2021.json')
+    server.response = FakeResponse(page(ROWS), headers={'ETag': '"v1"'})
+    index = ListingIndex(LISTING_URL, path)
+    index.refresh()
+
+    # 01001099999 removed, 01003099999 re-stamped (and resized), 01004099999 added
+    changed = [ROWS[1], ROWS[2], ('01003099999.csv', '2024-01-20 08:00', '3.4M'),
+               ('01004099999.csv', '2024-01-18 09:00', '1.0M')]
+    server.response = FakeResponse(page(changed), headers={'ETag': '"v2"'})
+    assert index.refresh() == (1, 1, 1)
+    expected = sorted((stamp, name, size) for name, stamp, size in changed)
+    assert index.records == expected
+    assert ListingIndex(LISTING_URL, path).records == expected
+    assert ListingIndex(LISTING_URL, path).etag == '"v2"'
+
+
+def test_refresh_raises_on_http_errors(server, tmp_path):
+    server.response = FakeResponse(status_code=503)
+    index = ListingIndex(LISTING_URL, str(tmp_path / '2021.json'))
+    with pytest.raises(main.requests.HTTPError):
+        index.refresh()
+    assert not os.path.exists(index.path)
+
+
+# --- Lookups ---
+@pytest.fixture
+def index(server, tmp_path):
+    server.response = FakeResponse(page(ROWS))
+    index = ListingIndex(LISTING_URL, str(tmp_path / '2021.json'))
+    index.refresh()
+    return index
+
+
+def test_between_includes_both_ends(index):
+    assert index.between('2024-01-19 10:27', '2024-01-19 14:55') == entries(ROWS[:3])
+    assert index.between('2024-01-19 14:55', '2024-01-19 15:00') == entries(ROWS[1:])
+    assert index.between('2024-01-19 10:28', '2024-01-19 14:54') == []
+    # A bare date starts at the beginning of that day
+    assert index.between('2024-01-19', '2024-01-19 10:27') == entries(ROWS[:1])
+
+
+def test_find_returns_every_file_with_the_timestamp(index):
+    assert index.find('2024-01-19 14:55') == entries(ROWS[1:3])
+    assert index.find('2024-01-19 15:00') == entries(ROWS[3:])
+    assert index.find('2024-01-19 14:56') == []
@@ -0,0 +1,177 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from lcd_values import parse_lcd_values, FLAG_MISSING
+
+# Per-file column statistics ("zone maps") for LCD station CSVs.
+# Each <station>.csv gets a <station>.csv.stats.json sidecar with the row count, the
+# DATE range and, per numeric column, min/max/sum/count of the parsed values and the
+# number of missing ones. Year-wide questions read the sidecars first and only open
+# files whose range can hold the answer: the highest value of a column is known
+# from the sidecars alone, and only the files holding it are read for the rows.
+#
+#   maps = load_zone_maps(csv_paths)                   # {path: zone map}
+#   maps[path]['columns']['HourlyDryBulbTemperature']  # {'min', 'max', 'sum', 'count', 'nulls'}
+#   paths = files_in_range(maps, 'HourlyDryBulbTemperature', low=100)
+
+STATS_SUFFIX = '.stats.json'
+# Bump when the sidecar layout changes so old ones are rebuilt
+ZONE_MAP_VERSION = 2
+# Small, because every value is read as a string: at 10k rows a ~120-column file
+# peaks below what streaming analysis uses
+ZONE_CHUNK_ROWS = 10_000
+# Text columns never get value stats; every other column does if any of its values parse
+TEXT_COLUMNS = {'STATION', 'DATE', 'NAME', 'REPORT_TYPE', 'SOURCE', 'REM'}
+
+
+def stats_path(csv_path):
+    return csv_path + STATS_SUFFIX
+
+
+def file_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def merge_column(total, values, flags):
+    present = values[~np.isnan(values)]
+    total['nulls'] += int(((flags & FLAG_MISSING) != 0).sum())
+    if not len(present):
+        return
+    low, high = float(present.min()), float(present.max())
+    total['min'] = low if total['min'] is None else min(total['min'], low)
+    total['max'] = high if total['max'] is None else max(total['max'], high)
+    total['sum'] += float(present.sum())
+    total['count'] += len(present)
+
+
+def build_zone_map(csv_path, chunksize=ZONE_CHUNK_ROWS):
+    # One chunked pass over every column, all read as text and parsed with the same
+    # parser the analysis uses, so a sidecar's max equals what analysis would find
+    columns = {}
+    rows = 0
+    first_date = last_date = None
+    # Text columns are never read (REM alone is most of a file's bytes), except DATE
+    usecols = lambda column: column == 'DATE' or column not in TEXT_COLUMNS
+    for chunk in pd.read_csv(csv_path, dtype=str, usecols=usecols, chunksize=chunksize):
+        rows += len(chunk)
+        if 'DATE' in chunk:
+            dates = chunk['DATE'].dropna()
+            if len(dates):
+                # ISO timestamps, so string order is time order
+                low, high = dates.min(), dates.max()
+                first_date = low if first_date is None else min(first_date, low)
+                last_date = high if last_date is None else max(last_date, high)
+        for column in chunk.columns:
+            if column in TEXT_COLUMNS:
+                continue
+            total = columns.setdefault(column, {'min': None, 'max': None, 'sum': 0.0, 'count': 0, 'nulls': 0})
+            merge_column(total, *parse_lcd_values(chunk[column]))
+    return {
+        'version': ZONE_MAP_VERSION,
+        'file': os.path.basename(csv_path),
+        'source': file_signature(csv_path),
+        'rows': rows,
+        'date_min': first_date,
+        'date_max': last_date,
+        # Columns where nothing parsed (sky conditions, weather codes) aren't numeric
+        'columns': {column: total for column, total in columns.items() if total['count']},
+    }
+
+
+def write_zone_map(csv_path):
+    # Write-then-rename so a reader never sees half a sidecar
+    zone_map = build_zone_map(csv_path)
+    tmp_path = stats_path(csv_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(zone_map, f, indent=2)
+    os.replace(tmp_path, stats_path(csv_path))
+    return zone_map
+
+
+def load_zone_map(csv_path):
+    # None when there is no sidecar or it no longer matches the CSV
+    try:
+        with open(stats_path(csv_path)) as f:
+            zone_map = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if zone_map.get('version') != ZONE_MAP_VERSION or zone_map.get('source') != file_signature(csv_path):
+        return None
+    return zone_map
+
+
+def zone_map_for(csv_path):
+    # Returns (csv_path, zone map or None if the file can't be parsed)
+    try:
+        return csv_path, load_zone_map(csv_path) or write_zone_map(csv_path)
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        print(f"No zone map for {csv_path}: {e}")
+        return csv_path, None
+
+
+def load_zone_maps(csv_paths, workers=1):
+    # {csv_path: zone map or None}; missing or stale sidecars are built on a process pool
+    maps = {path: load_zone_map(path) for path in csv_paths}
+    missing = [path for path, zone_map in maps.items() if zone_map is None]
+    if missing:
+        print(f"Building zone maps for {len(missing)} files")
+        if workers > 1 and len(missing) > 1:
+            chunksize = max(1, len(missing) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                maps.update(executor.map(zone_map_for, missing, chunksize=chunksize))
+        else:
+            maps.update(map(zone_map_for, missing))
+    return maps
+
+
+# --- Pruning ---
+# Stale sidecars are rebuilt by load_zone_maps, so a file left with None couldn't be
+# parsed at all; the functions below skip those and callers report them.
+def column_stats(maps, column):
+    # Year-wide min/max/mean/count of a column from the sidecars alone
+    total = {'min': None, 'max': None, 'sum': 0.0, 'count': 0, 'nulls': 0}
+    for zone_map in maps.values():
+        stats = (zone_map or {}).get('columns', {}).get(column)
+        if stats is None:
+            continue
+        for name in ('sum', 'count', 'nulls'):
+            total[name] += stats[name]
+        total['min'] = stats['min'] if total['min'] is None else min(total['min'], stats['min'])
+        total['max'] = stats['max'] if total['max'] is None else max(total['max'], stats['max'])
+    total['mean'] = total['sum'] / total['count'] if total['count'] else None
+    return total
+
+
+def extreme_files(maps, column, largest=True):
+    # (value, paths to open): the column's highest (or lowest) value across the
+    # sidecars and the files that hold it
+    pick = max if largest else min
+    bound = 'max' if largest else 'min'
+    candidates = {path: zone_map['columns'][column][bound] for path, zone_map in maps.items()
+                  if zone_map is not None and column in zone_map['columns']}
+    value = pick(candidates.values()) if candidates else None
+    paths = [path for path, found in candidates.items() if found == value]
+    return value, sorted(paths)
+
+
+def files_in_range(maps, column, low=None, high=None, date_from=None, date_to=None):
+    # Paths whose column range overlaps [low, high] and whose DATE range overlaps
+    # [date_from, date_to]; None leaves that side open. Dates compare as ISO strings,
+    # so date_to='2021-06-30' stops at the start of that day.
+    paths = []
+    for path, zone_map in maps.items():
+        stats = (zone_map or {}).get('columns', {}).get(column)
+        if stats is None:
+            continue
+        if (low is not None and stats['max'] < low) or (high is not None and stats['min'] > high):
+            continue
+        if (date_from is not None or date_to is not None) and zone_map['date_min'] is None:
+            continue
+        if (date_from is not None and zone_map['date_max'] < date_from) or \
+                (date_to is not None and zone_map['date_min'] > date_to):
+            continue
+        paths.append(path)
+    return sorted(paths)